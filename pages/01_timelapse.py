@@ -1,25 +1,4 @@
-import os
-import ee
-import geemap
-import ipywidgets as widgets
-from IPython.display import display
-import solara
+from surface_water.startup import lazy_page
 
-
-class Map(geemap.Map):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.add_basemap("Esri.WorldImagery")
-        self.add_gui("timelapse", basemap=None)
-
-
-@solara.component
-def Page():
-    with solara.Column(style={"min-width": "500px"}):
-        Map.element(
-            center=[20, -0],
-            zoom=2,
-            height="750px",
-            zoom_ctrl=False,
-            measure_ctrl=False,
-        )
+# The map, Earth Engine and geemap are imported when the page is first shown.
+Page = lazy_page("surface_water.pages.timelapse")
@@ -0,0 +1 @@
+"""Shared building blocks for the Solara surface water pages."""
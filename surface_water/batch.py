@@ -0,0 +1,215 @@
+"""Compute surface water statistics of many regions without the web app.
+
+Reads the regions from any file geopandas can read (GeoJSON, GeoPackage,
+...), computes one statistic per region with a bounded number of concurrent
+Earth Engine requests, and writes all results to a Parquet file::
+
+    python -m surface_water.batch reservoirs.gpkg occurrence.parquet \\
+        --job occurrence --scale 90 --id-column name
+
+The result of every region is checkpointed as soon as it is computed, so an
+interrupted run picks up where it stopped when started again with the same
+arguments. Regions that fail are retried on the next run.
+
+Jobs are plain functions of a GeoJSON geometry and the options, looked up in
+a mapping passed to :func:`run_batch`, so the whole pipeline can be run
+against a fake backend without Earth Engine.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from . import config, regions
+from .cache import make_key
+from .reduction import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+
+def occurrence_job(geometry, options):
+    """Water occurrence histogram, like the Occurrence button of the JRC page."""
+    from . import jrc
+
+    return jrc.occurrence_histogram(
+        regions.prepare(geometry, options.scale), options.scale
+    )
+
+
+def history_job(geometry, options):
+    """Monthly water area, like the Monthly history button of the JRC page."""
+    from . import jrc
+
+    return jrc.monthly_history(regions.prepare(geometry, options.scale), options.scale)
+
+
+def change_job(geometry, options):
+    """Area of the water change classes of the compare page."""
+    from . import compare
+
+    return compare.change_areas(
+        regions.prepare(geometry, options.scale),
+        (options.pre_start, options.pre_end, options.pre_cloud),
+        (options.post_start, options.post_end, options.post_cloud),
+        options.threshold,
+        options.scale,
+    )
+
+
+JOBS = {
+    "occurrence": occurrence_job,
+    "history": history_job,
+    "change": change_job,
+}
+
+
+def read_rois(path, id_column=None):
+    """Read regions of interest from a vector file.
+
+    Args:
+        path (str): Any file geopandas can read, e.g. GeoJSON or GeoPackage.
+        id_column (str, optional): Column identifying the regions. Defaults
+            to None, i.e. the row number.
+
+    Returns:
+        list: ``(roi_id, geometry)`` pairs, with GeoJSON geometries in
+            EPSG:4326. Empty geometries are skipped.
+
+    Raises:
+        ValueError: If ``id_column`` has duplicate values, whose results and
+            checkpoints would overwrite each other.
+    """
+    import geopandas as gpd
+
+    gdf = gpd.read_file(path)
+    if gdf.crs is not None:
+        gdf = gdf.to_crs(epsg=4326)
+    ids = gdf.index if id_column is None else gdf[id_column].astype(str)
+    duplicates = sorted(set(ids[ids.duplicated()]))
+    if duplicates:
+        raise ValueError(
+            f"Column {id_column} does not identify the regions, duplicate "
+            f"values: {', '.join(duplicates[:10])}"
+        )
+    return [
+        (str(roi_id), geometry.__geo_interface__)
+        for roi_id, geometry in zip(ids, gdf.geometry)
+        if geometry is not None and not geometry.is_empty
+    ]
+
+
+def _write_parquet(df, path):
+    tmp = f"{path}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def run_batch(rois, job, output, options, jobs=None, max_workers=None):
+    """Compute a statistic of every region, resuming from checkpoints.
+
+    Args:
+        rois (list): ``(roi_id, geometry)`` pairs, see :func:`read_rois`.
+        job (str): Name of the job in ``jobs``.
+        output (str): Path of the Parquet file of all results. Results of
+            single regions are checkpointed next to it, in ``{output}.parts``.
+        options (argparse.Namespace): Options of the job, e.g. ``scale``.
+        jobs (dict, optional): Job functions by name, taking a GeoJSON
+            geometry and ``options`` and returning a data frame. Defaults to
+            :data:`JOBS`.
+        max_workers (int, optional): Regions computed at the same time.
+            Defaults to ``config.MAX_WORKERS``.
+
+    Returns:
+        dict: The number of regions ``computed``, ``resumed`` from a
+            checkpoint and ``failed``.
+    """
+    fn = (JOBS if jobs is None else jobs)[job]
+    max_workers = config.MAX_WORKERS if max_workers is None else max_workers
+    # Checkpoints of other jobs or options never mix with these.
+    parts = os.path.join(
+        f"{output}.parts", make_key(job, sorted(vars(options).items()))[:16]
+    )
+    os.makedirs(parts, exist_ok=True)
+
+    def part_path(roi_id):
+        return os.path.join(parts, f"{make_key(roi_id)[:32]}.parquet")
+
+    def compute(roi_id, geometry):
+        df = call_with_retry(lambda: fn(geometry, options)).copy()
+        df.insert(0, "roi", roi_id)
+        _write_parquet(df, part_path(roi_id))
+
+    todo = [(i, g) for i, g in rois if not os.path.exists(part_path(i))]
+    summary = {"computed": 0, "resumed": len(rois) - len(todo), "failed": 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(compute, i, g): i for i, g in todo}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                summary["computed"] += 1
+            except Exception as e:
+                logger.error("Region %s failed: %s", futures[future], e)
+                summary["failed"] += 1
+            logger.info("%d of %d regions done", sum(summary.values()), len(rois))
+
+    frames = [
+        pd.read_parquet(part_path(i)) for i, _ in rois if os.path.exists(part_path(i))
+    ]
+    if frames:
+        _write_parquet(pd.concat(frames, ignore_index=True), output)
+    return summary
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m surface_water.batch",
+        description="Compute surface water statistics of many regions.",
+    )
+    parser.add_argument("rois", help="GeoJSON, GeoPackage or other vector file")
+    parser.add_argument("output", help="Parquet file of the results")
+    parser.add_argument("--job", choices=sorted(JOBS), default="occurrence")
+    parser.add_argument("--id-column", help="column identifying the regions")
+    parser.add_argument("--scale", type=float, default=90, help="meters")
+    parser.add_argument("--workers", type=int, default=config.MAX_WORKERS)
+    parser.add_argument("--pre-start", type=_date, default=_date("2014-01-01"))
+    parser.add_argument("--pre-end", type=_date, default=_date("2014-12-31"))
+    parser.add_argument("--pre-cloud", type=int, default=25)
+    parser.add_argument("--post-start", type=_date, default=_date("2024-01-01"))
+    parser.add_argument("--post-end", type=_date, default=_date("2024-12-31"))
+    parser.add_argument("--post-cloud", type=int, default=30)
+    parser.add_argument("--threshold", type=float, default=0.0, help="NDWI")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    import geemap
+
+    geemap.ee_initialize()
+    try:
+        rois = read_rois(args.rois, args.id_column)
+    except ValueError as e:
+        parser.error(str(e))
+    options = argparse.Namespace(
+        **{
+            k: v
+            for k, v in vars(args).items()
+            if k not in ("rois", "output", "id_column", "workers", "job")
+        }
+    )
+    summary = run_batch(rois, args.job, args.output, options, max_workers=args.workers)
+    print(
+        f"{summary['computed']} computed, {summary['resumed']} resumed, "
+        f"{summary['failed']} failed"
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,429 @@
+"""Measure the Earth Engine round trips of every page interaction.
+
+The pages are driven headlessly: each page's ``Map`` is constructed like
+``Page`` does, a region of interest is drawn, and its widgets are clicked or
+changed in turn, waiting for the work they submit. Every HTTP request of the
+Earth Engine client goes through a :class:`RecordingTransport`, which counts
+round trips, bytes sent and received and time spent per interaction.
+
+Record the responses of a run against Earth Engine once, then replay them
+offline with a simulated latency, so that the numbers only change when the
+page logic or geemap does::
+
+    python -m surface_water.benchmark --record benchmark.json
+    python -m surface_water.benchmark --replay benchmark.json --latency 0.2
+
+Every run starts from empty caches, without their disk tier, so that results
+of earlier runs do not hide requests. The end date of the monthly histories
+and of the time series is pinned to the day of the recording, so that the
+requests of a replay match the recorded ones on any later day.
+
+Requests made outside of the Earth Engine client, such as map tiles loaded by
+the browser, are not counted. Requests still running in the background when
+an interaction ends are counted with the next one.
+"""
+
+import argparse
+import base64
+import datetime
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+
+import pandas as pd
+
+from . import cache, config
+from .cache import make_key
+
+logger = logging.getLogger(__name__)
+
+# Lake Mead, a region with water and a few years of changes.
+DEFAULT_ROI = {
+    "type": "Polygon",
+    "coordinates": [
+        [[-114.9, 36.0], [-114.3, 36.0], [-114.3, 36.5], [-114.9, 36.5], [-114.9, 36.0]]
+    ],
+}
+
+# Keyword arguments of the Map of every page, as in its Page component.
+MAP_KWARGS = {
+    "center": [20, -0],
+    "zoom": 2,
+    "height": "750px",
+    "zoom_ctrl": False,
+    "measure_ctrl": False,
+}
+
+
+class RecordingTransport:
+    """An ``httplib2.Http``-like transport recording every round trip.
+
+    Args:
+        inner (object, optional): The transport making the requests, e.g.
+            ``ee._cloud_api_utils._Http``. Defaults to None, i.e. replaying
+            the responses of ``cassette``.
+        cassette (dict, optional): Recorded responses by request key. Filled
+            when ``inner`` is given. Defaults to an empty dict.
+        latency (float, optional): Seconds added to every round trip.
+            Defaults to 0.
+    """
+
+    def __init__(self, inner=None, cassette=None, latency=0.0):
+        self.inner = inner
+        self.cassette = {} if cassette is None else cassette
+        self.latency = latency
+        self.interaction = None
+        self.calls = []
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(uri, method, body):
+        parts = urllib.parse.urlsplit(uri)
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        return make_key(method, parts.path, parts.query, body)
+
+    def request(
+        self,
+        uri,
+        method="GET",
+        body=None,
+        headers=None,
+        redirections=None,
+        connection_type=None,
+    ):
+        import httplib2
+
+        key = self._key(uri, method, body)
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        if self.inner is not None:
+            response, content = self.inner.request(
+                uri, method=method, body=body, headers=headers
+            )
+            with self._lock:
+                self.cassette[key] = {
+                    "status": int(response.status),
+                    "headers": {k: str(v) for k, v in response.items()},
+                    "content": base64.b64encode(content).decode("ascii"),
+                }
+        else:
+            entry = self.cassette.get(key)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                logger.warning("No recorded response for %s %s", method, uri)
+                entry = {
+                    "status": 404,
+                    "headers": {"content-type": "application/json"},
+                    "content": base64.b64encode(
+                        json.dumps(
+                            {
+                                "error": {
+                                    "code": 404,
+                                    "message": f"Not recorded: {method} {uri}",
+                                    "status": "NOT_FOUND",
+                                }
+                            }
+                        ).encode()
+                    ).decode("ascii"),
+                }
+            response = httplib2.Response(
+                {**entry["headers"], "status": entry["status"]}
+            )
+            content = base64.b64decode(entry["content"])
+        seconds = time.perf_counter() - start
+        sent = len(body) if body else 0
+        with self._lock:
+            self.calls.append(
+                {
+                    "interaction": self.interaction,
+                    "method": method,
+                    "path": urllib.parse.urlsplit(uri).path,
+                    "sent": sent,
+                    "received": len(content),
+                    "seconds": seconds,
+                }
+            )
+        return response, content
+
+
+def initialize(transport, project=None):
+    """Initialize Earth Engine with every request going through ``transport``.
+
+    Replaying transports need no credentials, recording ones use the
+    persistent credentials of ``earthengine authenticate``.
+    """
+    import ee
+
+    if transport.inner is None:
+        from google.auth.credentials import AnonymousCredentials
+
+        ee.Initialize(
+            credentials=AnonymousCredentials(),
+            project=project or "benchmark",
+            http_transport=transport,
+        )
+    else:
+        ee.Initialize(project=project, http_transport=transport)
+
+
+def isolate(end_date):
+    """Make the Earth Engine requests of a run independent of earlier runs.
+
+    Args:
+        end_date (str): End of the monthly histories, see
+            ``config.HISTORY_END``.
+    """
+    from .map_ids import map_ids
+
+    cache.isolate()
+    map_ids.clear()
+    config.HISTORY_END = end_date
+
+
+def load_page(filename):
+    """Import the module of a page, e.g. ``surface_water.pages.jrc``.
+
+    Args:
+        filename (str): File name of the page, e.g. ``03_jrc.py``.
+
+    Returns:
+        module: The module defining the ``Map`` of the page.
+    """
+    name = os.path.splitext(filename)[0].lstrip("0123456789_")
+    return importlib.import_module(f"surface_water.pages.{name}")
+
+
+def find_widget(m, description):
+    """Return the widget of a map's controls with the given description."""
+    stack = [c.widget for c in m.controls if hasattr(c, "widget")]
+    while stack:
+        widget = stack.pop()
+        if getattr(widget, "description", None) == description:
+            return widget
+        stack.extend(getattr(widget, "children", ()))
+    raise KeyError(f"No widget {description!r}")
+
+
+def draw(geometry):
+    """Return an action drawing ``geometry`` as the region of interest."""
+
+    def action(m):
+        m._draw_control._handle_geometry_created(geometry)
+
+    return action
+
+
+def click(description):
+    """Return an action clicking a button."""
+
+    def action(m):
+        find_widget(m, description).click()
+
+    return action
+
+
+def set_value(description, value):
+    """Return an action setting the value of a widget."""
+
+    def action(m):
+        widget = find_widget(m, description)
+        widget.value = value(widget) if callable(value) else value
+
+    return action
+
+
+def _next_option(widget):
+    options = list(widget.options)
+    return options[(options.index(widget.value) + 1) % len(options)]
+
+
+def scenarios(roi, end_date=None):
+    """Return the interactions of every page, by page file name.
+
+    Args:
+        roi (dict): GeoJSON region of interest.
+        end_date (str, optional): The day of the run, as YYYY-MM-DD, whose
+            year ends the time series. Defaults to today.
+    """
+    end_date = end_date or datetime.date.today().isoformat()
+    return {
+        "02_timeseries.py": [
+            ("Draw ROI", draw(roi)),
+            ("End year", set_value("End Year:", int(end_date[:4]))),
+            ("Time slider", click("Time slider")),
+            ("Change bands", set_value("Bands:", _next_option)),
+            ("Split map", click("Split map")),
+        ],
+        "03_jrc.py": [
+            ("Draw ROI", draw(roi)),
+            ("Occurrence", click("Occurrence")),
+            ("Monthly history", click("Monthly history")),
+            ("Change months", set_value("Months", (6, 9))),
+        ],
+        "04_compare.py": [
+            ("Draw ROI", draw(roi)),
+            ("Compute NDWI", set_value("Compute NDWI", True)),
+            ("Change layer", set_value("Change layer", True)),
+            ("Apply", click("Apply")),
+            ("Change threshold", set_value("Threshold", 0.1)),
+        ],
+    }
+
+
+def perform(action, m=None, timeout=600):
+    """Run an action on a map and wait for the work it submits.
+
+    Args:
+        action (callable): Takes the map, or None, and returns a result. If
+            there is no map, the work of a returned map is waited for.
+        m (geemap.Map, optional): The page's map. Defaults to None.
+        timeout (float, optional): Seconds to wait for the work. Defaults
+            to 600.
+
+    Returns:
+        tuple: The result of the action and the seconds until its work was
+            done.
+    """
+    start = time.perf_counter()
+    result = action(m)
+    runner = getattr(result if m is None else m, "runner", None)
+    if runner is not None and not runner.wait(timeout):
+        logger.warning("Work did not finish in %s s", timeout)
+    return result, time.perf_counter() - start
+
+
+def run(transport, pages=None, roi=None, project=None, timeout=600, end_date=None):
+    """Initialize Earth Engine, then drive the pages and measure every step.
+
+    Caches are emptied first, see :func:`isolate`.
+
+    Args:
+        transport (RecordingTransport): The transport of Earth Engine.
+        pages (list, optional): Page file names. Defaults to all pages with
+            scenarios.
+        roi (dict, optional): GeoJSON region of interest. Defaults to
+            ``DEFAULT_ROI``.
+        project (str, optional): The Earth Engine project. Defaults to None.
+        timeout (float, optional): Seconds to wait for the work of one
+            interaction. Defaults to 600.
+        end_date (str, optional): The day the requests were recorded, as
+            YYYY-MM-DD, which ends the monthly histories and time series.
+            Defaults to today.
+
+    Returns:
+        pd.DataFrame: One row per page and interaction, with the number of
+            ``calls``, bytes ``sent`` and ``received``, ``ee_seconds`` spent
+            in requests and ``wall_seconds`` until the work was done.
+    """
+    end_date = end_date or datetime.date.today().isoformat()
+    isolate(end_date)
+    all_scenarios = scenarios(roi or DEFAULT_ROI, end_date)
+    rows = []
+
+    def measure(page, name, action, m=None):
+        transport.interaction = (page, name)
+        result, seconds = perform(action, m, timeout)
+        rows.append({"page": page, "interaction": name, "wall": seconds})
+        return result
+
+    measure("Earth Engine", "Initialize", lambda _: initialize(transport, project))
+    for page in pages or list(all_scenarios):
+        module = measure(page, "Import", lambda _: load_page(page))
+        m = measure(page, "Construct map", lambda _: module.Map(**MAP_KWARGS))
+        for name, action in all_scenarios[page]:
+            measure(page, name, action, m)
+    transport.interaction = None
+
+    calls = pd.DataFrame(
+        transport.calls,
+        columns=["interaction", "method", "path", "sent", "received", "seconds"],
+    )
+    report = []
+    for row in rows:
+        mine = calls[calls["interaction"] == (row["page"], row["interaction"])]
+        report.append(
+            {
+                "page": row["page"],
+                "interaction": row["interaction"],
+                "calls": len(mine),
+                "sent": int(mine["sent"].sum()),
+                "received": int(mine["received"].sum()),
+                "ee_seconds": round(float(mine["seconds"].sum()), 3),
+                "wall_seconds": round(row["wall"], 3),
+            }
+        )
+    return pd.DataFrame(report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m surface_water.benchmark",
+        description="Measure the Earth Engine round trips of page interactions.",
+    )
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--record", metavar="CASSETTE", help="record responses to")
+    mode.add_argument("--replay", metavar="CASSETTE", help="replay responses from")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--pages", nargs="+", help="page file names")
+    parser.add_argument("--roi", help="GeoJSON file of the region of interest")
+    parser.add_argument("--project", default=os.environ.get("EE_PROJECT_ID"))
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    roi = None
+    if args.roi:
+        with open(args.roi) as f:
+            roi = json.load(f)
+        roi = roi.get("geometry", roi)
+
+    if args.record:
+        import requests
+        from ee import _cloud_api_utils
+
+        transport = RecordingTransport(
+            _cloud_api_utils._Http(requests.Session()), latency=args.latency
+        )
+        end_date = datetime.date.today().isoformat()
+    else:
+        with open(args.replay) as f:
+            recorded = json.load(f)
+        # Request paths contain the project, and requests the end date, so
+        # replay with the recorded ones.
+        args.project = recorded["project"]
+        end_date = recorded.get("end_date")
+        transport = RecordingTransport(
+            cassette=recorded["responses"], latency=args.latency
+        )
+
+    report = run(transport, args.pages, roi, args.project, end_date=end_date)
+    print(report.to_string(index=False))
+    if transport.misses:
+        print(f"{transport.misses} requests were not recorded in the cassette")
+
+    if args.record:
+        import ee
+
+        with open(args.record, "w") as f:
+            json.dump(
+                {
+                    "project": ee.data._get_state().cloud_api_user_project,
+                    "end_date": end_date,
+                    "responses": transport.cassette,
+                },
+                f,
+            )
+    if args.output:
+        report.to_json(args.output, orient="records", indent=2)
+
+
+if __name__ == "__main__":
+    main()
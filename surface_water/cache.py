@@ -0,0 +1,187 @@
+"""Two-tier cache for results computed from static Earth Engine datasets.
+
+Results are addressed by a hash of everything that determines them (dataset,
+region, scale, ...). Lookups go to an in-memory LRU first and then to a SQLite
+database on disk, which survives restarts and is shared by every session in
+the process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from . import config, metrics
+from .singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+# Every cache of the process, see isolate().
+_caches = weakref.WeakSet()
+
+
+def canonical_roi(region):
+    """Return a JSON-serializable, canonical description of a region.
+
+    Args:
+        region (ee.Geometry | ee.FeatureCollection): The region.
+
+    Returns:
+        dict | str: The canonical GeoJSON of a client-side geometry, see
+            :func:`surface_water.regions.canonical`, or the serialized
+            expression of any other object.
+    """
+    from .regions import canonical_geojson
+
+    try:
+        geojson = region.toGeoJSON()
+    except Exception:
+        return region.serialize()
+    return canonical_geojson(geojson)
+
+
+def make_key(*parts):
+    """Hash the given JSON-serializable parts into a cache key.
+
+    Returns:
+        str: The hex digest of the parts.
+    """
+    text = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """An in-memory LRU backed by an optional SQLite table.
+
+    Args:
+        name (str): Name of the cache, used as the database file name.
+        maxsize (int, optional): Number of results kept in memory. Defaults to
+            ``config.CACHE_SIZE``.
+        directory (str, optional): Directory of the database. An empty string
+            disables the disk tier. Defaults to ``config.CACHE_DIR``.
+    """
+
+    def __init__(self, name, maxsize=None, directory=None):
+        self.name = name
+        self.maxsize = config.CACHE_SIZE if maxsize is None else maxsize
+        directory = config.CACHE_DIR if directory is None else directory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._path = None
+        _caches.add(self)
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._path = os.path.join(directory, f"{name}.sqlite")
+                with self._connect() as conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS results "
+                        "(key TEXT PRIMARY KEY, value BLOB, created REAL)"
+                    )
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("Disk cache %s disabled: %s", name, e)
+                self._path = None
+
+    def _connect(self):
+        return sqlite3.connect(self._path, timeout=30)
+
+    def get(self, key, default=None):
+        """Return the result stored under ``key``, or ``default``."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if self._path is None:
+            return default
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value FROM results WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Reading disk cache %s failed: %s", self.name, e)
+            return default
+        if row is None:
+            return default
+        value = pickle.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        """Store ``value`` under ``key`` in both tiers."""
+        self._remember(key, value)
+        if self._path is None:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.warning("Writing disk cache %s failed: %s", self.name, e)
+
+    def get_or_compute(self, key, fn):
+        """Return the result under ``key``, computing and storing it if missing.
+
+        Concurrent calls for the same missing key, from any session, share a
+        single computation.
+
+        Args:
+            key (str): The cache key.
+            fn (callable): Computes the result. Called without arguments.
+
+        Returns:
+            object: The cached or computed result.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            metrics.CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return value
+        metrics.CACHE_REQUESTS.inc(cache=self.name, result="miss")
+
+        def compute():
+            # The previous run for the key may have finished in the meantime.
+            value = self.get(key, missing)
+            if value is missing:
+                value = fn()
+                self.set(key, value)
+            return value
+
+        return flights.do((self.name, key), compute)
+
+    def clear(self):
+        """Remove every result from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        if self._path is not None:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results")
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+
+def isolate():
+    """Empty every cache of the process and stop using their disk tier.
+
+    Caches created afterwards have no disk tier either. Results on disk are
+    kept for other processes. Used by :mod:`surface_water.benchmark`, so that
+    results of earlier runs do not hide Earth Engine requests.
+    """
+    config.CACHE_DIR = ""
+    for cache in list(_caches):
+        with cache._lock:
+            cache._memory.clear()
+            cache._path = None
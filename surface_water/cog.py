@@ -0,0 +1,206 @@
+"""The JRC occurrence band from a locally staged Cloud-Optimized GeoTIFF.
+
+An alternative to Earth Engine for the static occurrence band. Histograms
+read only the window of the COG covering the region, at the overview matching
+the requested scale, masked by the region's polygon and counted with
+``np.bincount``. Map tiles are read the same way for the tile's bounds,
+warped to Web Mercator and colored with the palette of the layer. Requires
+rasterio, which localtileserver installs.
+"""
+
+import io
+import math
+import os
+
+import numpy as np
+from PIL import Image
+
+from .regions import METERS_PER_DEGREE
+
+try:
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.features import bounds as geometry_bounds
+    from rasterio.features import geometry_mask
+    from rasterio.transform import from_bounds as transform_from_bounds
+    from rasterio.warp import reproject, transform_bounds, transform_geom
+    from rasterio.windows import from_bounds
+except ImportError:
+    rasterio = None
+
+# Occurrence is a percentage, any other value is no data.
+_MAX_OCCURRENCE = 100
+
+# Half the width of the Web Mercator world, in meters.
+_MERCATOR_EXTENT = 20037508.342789244
+
+TILE_SIZE = 256
+
+
+def available(path):
+    """Return True if histograms can be computed from the COG at ``path``."""
+    return rasterio is not None and bool(path) and _exists(path)
+
+
+def _exists(path):
+    return path.startswith(("http://", "https://", "/vsi")) or os.path.exists(path)
+
+
+def _read(src, bounds, resolution, masked=False):
+    """Read the first band of ``src`` within bounds, near a resolution.
+
+    Args:
+        src (rasterio.DatasetReader): The dataset.
+        bounds (tuple): West, south, east and north, in the CRS of ``src``.
+        resolution (float): The pixel size to read at, in the units of the
+            CRS of ``src``. Coarser than the native one reads an overview.
+        masked (bool, optional): Return a masked array, masking the no data
+            value and the mask of ``src``. Defaults to False.
+
+    Returns:
+        tuple: The data and its affine transform, or None if the bounds are
+            outside of the dataset.
+    """
+    window = from_bounds(*bounds, transform=src.transform)
+    window = window.round_offsets().round_lengths()
+    full = rasterio.windows.Window(0, 0, src.width, src.height)
+    if not rasterio.windows.intersect(window, full):
+        return None
+    window = window.intersection(full)
+    factor = max(1.0, resolution / abs(src.transform.a))
+    height = max(1, math.ceil(window.height / factor))
+    width = max(1, math.ceil(window.width / factor))
+    data = src.read(
+        1,
+        window=window,
+        out_shape=(height, width),
+        resampling=Resampling.nearest,
+        masked=masked,
+    )
+    transform = src.window_transform(window) * rasterio.Affine.scale(
+        window.width / width, window.height / height
+    )
+    return data, transform
+
+
+def occurrence_histogram(path, geometry, scale):
+    """Compute the frequency histogram of occurrence within a polygon.
+
+    Args:
+        path (str): Path or URL of the occurrence COG.
+        geometry (dict): GeoJSON geometry of the region, in EPSG:4326.
+        scale (float): Pixel size in meters at which to count pixels.
+
+    Pixels with no data, and those where water was never observed, are not
+    counted, as they are masked in the Earth Engine occurrence band.
+
+    Returns:
+        dict: Occurrence values, as strings, mapped to pixel counts, like the
+            ``frequencyHistogram`` reducer of Earth Engine.
+    """
+    if rasterio is None:
+        raise ImportError("The COG histogram engine requires rasterio.")
+    with rasterio.open(path) as src:
+        if src.crs is not None and src.crs.to_string() != "EPSG:4326":
+            geometry = transform_geom("EPSG:4326", src.crs, geometry)
+        # Read at the requested scale; rasterio uses the overviews of the COG.
+        resolution = scale
+        if src.crs is None or src.crs.is_geographic:
+            resolution /= METERS_PER_DEGREE
+        read = _read(src, geometry_bounds(geometry), resolution, masked=True)
+        if read is None:
+            return {}
+        data, transform = read
+        inside = geometry_mask(
+            [geometry], out_shape=data.shape, transform=transform, invert=True
+        )
+
+    values = data.data[inside & ~np.ma.getmaskarray(data)]
+    values = values[(values > 0) & (values <= _MAX_OCCURRENCE)].astype(np.int64)
+    counts = np.bincount(values, minlength=_MAX_OCCURRENCE + 1)
+    return {str(v): int(c) for v, c in enumerate(counts) if c}
+
+
+def palette_lut(vis_params):
+    """Color every 8-bit value the way Earth Engine applies a palette.
+
+    Values are stretched from ``min`` to ``max`` and interpolated linearly
+    between the colors of ``palette``.
+
+    Args:
+        vis_params (dict): Visualization parameters with ``min``, ``max`` and
+            ``palette`` as hex colors.
+
+    Returns:
+        np.ndarray: RGBA colors of the values 0 to 255, of shape (256, 4).
+    """
+    colors = np.array(
+        [
+            [int(c.lstrip("#")[i : i + 2], 16) for i in (0, 2, 4)]
+            for c in vis_params["palette"]
+        ],
+        dtype=float,
+    )
+    low, high = vis_params.get("min", 0), vis_params.get("max", 1)
+    position = np.clip((np.arange(256) - low) / (high - low), 0, 1) * (len(colors) - 1)
+    lut = np.empty((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.round(
+            np.interp(position, np.arange(len(colors)), colors[:, channel])
+        )
+    lut[:, 3] = 255
+    return lut
+
+
+def tile_bounds(z, x, y):
+    """Return the Web Mercator bounds of a tile, west, south, east and north."""
+    size = 2 * _MERCATOR_EXTENT / 2**z
+    west = -_MERCATOR_EXTENT + x * size
+    north = _MERCATOR_EXTENT - y * size
+    return west, north - size, west + size, north
+
+
+def render_tile(path, z, x, y, vis_params):
+    """Render a map tile of the occurrence COG as a PNG.
+
+    Pixels with no data, and those where water was never observed, are
+    transparent like the masked pixels of the Earth Engine layer.
+
+    Args:
+        path (str): Path or URL of the occurrence COG.
+        z (int): The zoom level.
+        x (int): The column.
+        y (int): The row.
+        vis_params (dict): Visualization parameters, see :func:`palette_lut`.
+
+    Returns:
+        bytes: The PNG tile.
+    """
+    if rasterio is None:
+        raise ImportError("Rendering COG tiles requires rasterio.")
+    bounds = tile_bounds(z, x, y)
+    tile = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    with rasterio.open(path) as src:
+        crs = src.crs or "EPSG:4326"
+        src_bounds = transform_bounds("EPSG:3857", crs, *bounds)
+        resolution = (src_bounds[2] - src_bounds[0]) / TILE_SIZE
+        read = _read(src, src_bounds, resolution)
+        if read is not None:
+            data, transform = read
+            data = np.where(data <= _MAX_OCCURRENCE, data, 0).astype(np.uint8)
+            reproject(
+                data,
+                tile,
+                src_transform=transform,
+                src_crs=crs,
+                src_nodata=0,
+                dst_transform=transform_from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+                dst_crs="EPSG:3857",
+                dst_nodata=0,
+                resampling=Resampling.nearest,
+            )
+    rgba = palette_lut(vis_params)[tile]
+    rgba[tile == 0, 3] = 0
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG")
+    return buffer.getvalue()
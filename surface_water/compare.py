@@ -0,0 +1,507 @@
+"""Pre- and post-event composites and NDWI water change of a region."""
+
+import base64
+import datetime
+import io
+import math
+
+import ee
+import geemap
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from . import config
+from .cache import ResultCache, canonical_roi, make_key
+from .reduction import call_with_retry, region_bounds
+from .singleflight import flights
+
+# Landsat 8 data is taken from HLS from this date onward.
+HLS_START = "2013-04-11"
+HLS_ID = "NASA/HLS/HLSL30/v002"
+
+# Scenes of the annual composites of geemap.landsat_timeseries, which are
+# taken from the same part of every year.
+LANDSAT_IDS = (
+    "LANDSAT/LC09/C02/T1_L2",
+    "LANDSAT/LC08/C02/T1_L2",
+    "LANDSAT/LE07/C02/T1_L2",
+    "LANDSAT/LT05/C02/T1_L2",
+    "LANDSAT/LT04/C02/T1_L2",
+)
+LANDSAT_SEASON = ("06-10", "09-20")
+
+VIS_PARAMS = {"bands": ["B6", "B5", "B4"], "min": 0, "max": 0.4}
+NDWI_VIS = {"min": -1, "max": 1, "palette": "ndwi"}
+
+# Classes of the water change image. Land is masked.
+DISAPPEARED_WATER = 1
+NEW_WATER = 2
+UNCHANGED_WATER = 3
+CHANGE_VIS = {"min": 1, "max": 3, "palette": ["brown", "cyan", "blue"]}
+CHANGE_COLORS = ["a52a2a", "00ffff", "0000ff"]
+CHANGE_LEGEND = {
+    "Disappeared water": CHANGE_COLORS[0],
+    "New water": CHANGE_COLORS[1],
+    "Unchanged water": CHANGE_COLORS[2],
+}
+CHANGE_LAYER = "Water Change"
+# The layers shown instead of the change layer, and their colors.
+WATER_COLORS = {
+    "Pre-event Water": "0000ff",
+    "Post-event Water": "ff0000",
+    "Disappeared Water": CHANGE_COLORS[0],
+    "New Water": CHANGE_COLORS[1],
+}
+
+# NDWI is downloaded as int16 in units of 1e-4, with this value for no data.
+NDWI_SCALE = 10_000
+NDWI_NODATA = -32768
+
+_EARTH_RADIUS = 6378137
+
+# Scene counts change as new scenes are ingested, so they are only kept in
+# memory, and for the day.
+_availability_cache = ResultCache("compare_availability", directory="")
+
+
+def period_collection(roi, start_date, end_date, cloud_cover):
+    """Return the Landsat or HLS images of a period over a region.
+
+    Args:
+        roi (ee.FeatureCollection): The region of interest.
+        start_date (datetime.date): The first day of the period.
+        end_date (datetime.date): The last day of the period.
+        cloud_cover (int): Maximum cloud cover in percent of HLS images.
+
+    Returns:
+        ee.ImageCollection: Images with the bands B6 (SWIR1), B5 (NIR),
+            B4 (red) and B3 (green).
+    """
+    if start_date.strftime("%Y-%m-%d") < HLS_START:
+        return geemap.landsat_timeseries(
+            roi,
+            start_year=start_date.year,
+            end_year=end_date.year,
+        ).select(["SWIR1", "NIR", "Red", "Green"], ["B6", "B5", "B4", "B3"])
+    return (
+        ee.ImageCollection(HLS_ID)
+        .filterBounds(roi)
+        .filterDate(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        .filter(ee.Filter.lt("CLOUD_COVERAGE", cloud_cover))
+    )
+
+
+def composite(roi, start_date, end_date, cloud_cover):
+    """Return the median composite of a period, clipped to the region.
+
+    Args:
+        See :func:`period_collection`.
+
+    Returns:
+        ee.Image: The composite.
+    """
+    return period_collection(roi, start_date, end_date, cloud_cover).median().clip(roi)
+
+
+def period_scenes(roi, start_date, end_date, cloud_cover):
+    """Return the scenes that the composite of a period is made of.
+
+    Args:
+        See :func:`period_collection`.
+
+    Returns:
+        tuple: The scenes used, all scenes of the period whatever their cloud
+            cover, as ``ee.ImageCollection``, and the name of their cloud
+            cover property.
+    """
+    if start_date.strftime("%Y-%m-%d") < HLS_START:
+        season = ee.Filter.Or(
+            *[
+                ee.Filter.date(
+                    f"{year}-{LANDSAT_SEASON[0]}", f"{year}-{LANDSAT_SEASON[1]}"
+                )
+                for year in range(start_date.year, end_date.year + 1)
+            ]
+        )
+        scenes = ee.ImageCollection(LANDSAT_IDS[0]).filterBounds(roi).filter(season)
+        for collection_id in LANDSAT_IDS[1:]:
+            scenes = scenes.merge(
+                ee.ImageCollection(collection_id).filterBounds(roi).filter(season)
+            )
+        # The Landsat composites do not filter on cloud cover.
+        return scenes, scenes, "CLOUD_COVER"
+    scenes = (
+        ee.ImageCollection(HLS_ID)
+        .filterBounds(roi)
+        .filterDate(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+    )
+    used = scenes.filter(ee.Filter.lt("CLOUD_COVERAGE", cloud_cover))
+    return used, scenes, "CLOUD_COVERAGE"
+
+
+def _scene_summary(scenes, all_scenes, cloud_property):
+    count = scenes.size()
+    all_count = all_scenes.size()
+    # Aggregates of empty collections are not computed.
+    stats = ee.Algorithms.If(
+        count,
+        ee.Dictionary(
+            {
+                "first": scenes.aggregate_min("system:time_start"),
+                "last": scenes.aggregate_max("system:time_start"),
+                "mean_cloud": scenes.aggregate_mean(cloud_property),
+            }
+        ),
+        ee.Dictionary(),
+    )
+    least_cloudy = ee.Algorithms.If(
+        all_count,
+        ee.Dictionary({"least_cloud": all_scenes.aggregate_min(cloud_property)}),
+        ee.Dictionary(),
+    )
+    return (
+        ee.Dictionary({"count": count, "all_count": all_count})
+        .combine(ee.Dictionary(stats))
+        .combine(ee.Dictionary(least_cloudy))
+    )
+
+
+def _to_date(millis):
+    if millis is None:
+        return None
+    return datetime.datetime.fromtimestamp(
+        millis / 1000, tz=datetime.timezone.utc
+    ).date()
+
+
+def availability(roi, pre_period, post_period):
+    """Count the scenes of both periods, in one Earth Engine request.
+
+    Args:
+        roi (ee.FeatureCollection): The region of interest.
+        pre_period (tuple): Start date, end date and cloud cover of the
+            pre-event period, see :func:`period_collection`.
+        post_period (tuple): The same for the post-event period.
+
+    Returns:
+        dict: For ``pre`` and ``post``, a dict with the number of scenes used
+            in ``count``, of scenes whatever their cloud cover in
+            ``all_count``, the dates of the ``first`` and ``last`` scenes used,
+            their ``mean_cloud`` cover and the ``least_cloud`` cover of any
+            scene, in percent. Dates and cloud covers are None without scenes.
+            Concurrent and repeated calls with the same inputs share a single
+            request.
+    """
+    key = make_key(
+        "availability",
+        canonical_roi(roi),
+        pre_period,
+        post_period,
+        datetime.date.today(),
+    )
+
+    def compute():
+        summary = ee.Dictionary(
+            {
+                "pre": _scene_summary(*period_scenes(roi, *pre_period)),
+                "post": _scene_summary(*period_scenes(roi, *post_period)),
+            }
+        )
+        result = call_with_retry(summary.getInfo)
+        for period in result.values():
+            period["first"] = _to_date(period.get("first"))
+            period["last"] = _to_date(period.get("last"))
+            period.setdefault("mean_cloud", None)
+            period.setdefault("least_cloud", None)
+        return result
+
+    return _availability_cache.get_or_compute(key, compute)
+
+
+def describe_availability(label, period, start_date):
+    """Describe the scenes of a period, and how to get some if there are none.
+
+    Args:
+        label (str): Name of the period, e.g. ``"Pre-event"``.
+        period (dict): The period's entry of :func:`availability`.
+        start_date (datetime.date): The first day of the period.
+
+    Returns:
+        str: One line of text.
+    """
+    landsat = start_date.strftime("%Y-%m-%d") < HLS_START
+    sensor = "Landsat" if landsat else "HLS"
+    if period["count"]:
+        return (
+            f"{label}: {period['count']} {sensor} scenes from {period['first']} "
+            f"to {period['last']}, {period['mean_cloud']:.0f}% cloud cover on "
+            "average."
+        )
+    if period["all_count"]:
+        least = math.floor(period["least_cloud"]) + 1
+        return (
+            f"{label}: none of the {period['all_count']} {sensor} scenes is "
+            f"below the cloud cover limit. Raise Cloud to at least {least} to "
+            "use the least cloudy one."
+        )
+    if landsat:
+        start, end = (
+            datetime.date(2000, *map(int, day.split("-"))).strftime("%B %d")
+            for day in LANDSAT_SEASON
+        )
+        return (
+            f"{label}: no Landsat scene from {start} to {end} of these years. "
+            "Widen the period."
+        )
+    return f"{label}: no HLS scene in this period. Widen the period."
+
+
+def ndwi(image):
+    """Return the normalized difference water index of a composite."""
+    return image.normalizedDifference(["B3", "B6"]).rename("NDWI")
+
+
+def water_change(pre_ndwi, post_ndwi, threshold):
+    """Classify the change of surface water between two periods.
+
+    Args:
+        pre_ndwi (ee.Image): NDWI of the pre-event composite.
+        post_ndwi (ee.Image): NDWI of the post-event composite.
+        threshold (float): Pixels with a greater NDWI are water.
+
+    Returns:
+        ee.Image: ``DISAPPEARED_WATER``, ``NEW_WATER`` or ``UNCHANGED_WATER``,
+            with land masked.
+    """
+    pre_water = pre_ndwi.gt(threshold)
+    post_water = post_ndwi.gt(threshold)
+    return pre_water.add(post_water.multiply(2)).rename("change").selfMask()
+
+
+def water_layers(pre_ndwi, post_ndwi, threshold, change):
+    """Return the water layers of a threshold.
+
+    Args:
+        pre_ndwi (ee.Image): NDWI of the pre-event composite.
+        post_ndwi (ee.Image): NDWI of the post-event composite.
+        threshold (float): Pixels with a greater NDWI are water.
+        change (bool): Whether to return the single classified layer of
+            :func:`water_change` instead of the layers of ``WATER_COLORS``.
+
+    Returns:
+        list: ``(image, vis_params, name)`` of every layer.
+    """
+    if change:
+        return [
+            (water_change(pre_ndwi, post_ndwi, threshold), CHANGE_VIS, CHANGE_LAYER)
+        ]
+    pre_water = pre_ndwi.gt(threshold)
+    post_water = post_ndwi.gt(threshold)
+    images = {
+        "Pre-event Water": pre_water,
+        "Post-event Water": post_water,
+        "Disappeared Water": pre_water.subtract(post_water).gt(0),
+        "New Water": post_water.subtract(pre_water).gt(0),
+    }
+    return [
+        (image.selfMask(), {"palette": [WATER_COLORS[name]]}, name)
+        for name, image in images.items()
+    ]
+
+
+def change_areas(region, pre_period, post_period, threshold, scale, denominator=1e4):
+    """Compute the area of every water change class within a region.
+
+    Args:
+        region (ee.Geometry): The region of interest.
+        pre_period (tuple): Start date, end date and cloud cover of the
+            pre-event period, see :func:`period_collection`.
+        post_period (tuple): The same for the post-event period.
+        threshold (float): Pixels with a greater NDWI are water.
+        scale (float): The scale in meters of the reduction.
+        denominator (float, optional): Converts square meters to the output
+            unit. Defaults to 1e4, i.e. hectares.
+
+    Returns:
+        pd.DataFrame: Change classes in ``class`` and their areas in ``Area``,
+            one row per class of :data:`CHANGE_LEGEND`.
+    """
+    roi = ee.FeatureCollection(region)
+    pre_ndwi = ndwi(composite(roi, *pre_period))
+    post_ndwi = ndwi(composite(roi, *post_period))
+    change = water_change(pre_ndwi, post_ndwi, threshold)
+    areas = (
+        ee.Image.pixelArea()
+        .divide(denominator)
+        .addBands(change)
+        .reduceRegion(
+            reducer=ee.Reducer.sum().group(groupField=1, groupName="class"),
+            geometry=region,
+            scale=scale,
+            maxPixels=1e12,
+            bestEffort=True,
+        )
+        .get("groups")
+    )
+    groups = call_with_retry(areas.getInfo)
+    by_class = {group["class"]: group["sum"] for group in groups}
+    values = (DISAPPEARED_WATER, NEW_WATER, UNCHANGED_WATER)
+    return pd.DataFrame(
+        {
+            "class": list(CHANGE_LEGEND),
+            "Area": [by_class.get(value, 0.0) for value in values],
+        }
+    )
+
+
+def _to_mercator(lon, lat):
+    x = math.radians(lon) * _EARTH_RADIUS
+    y = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * _EARTH_RADIUS
+    return x, y
+
+
+def _from_mercator(x, y):
+    lon = math.degrees(x / _EARTH_RADIUS)
+    lat = math.degrees(2 * math.atan(math.exp(y / _EARTH_RADIUS)) - math.pi / 2)
+    return lon, lat
+
+
+class LocalWaterChange:
+    """NDWI of both periods as local arrays, classified with NumPy.
+
+    Once downloaded, the water layers of any threshold are derived locally in
+    milliseconds, so the threshold can be tuned without Earth Engine requests.
+    The arrays are on a Web Mercator grid, so that they line up with the map
+    when shown as an image overlay.
+
+    Args:
+        pre (np.ndarray): Pre-event NDWI, see ``NDWI_SCALE`` and ``NDWI_NODATA``.
+        post (np.ndarray): Post-event NDWI, on the same grid.
+        bounds (tuple): ``((south, west), (north, east))`` of the grid.
+    """
+
+    def __init__(self, pre, post, bounds):
+        self.pre = pre
+        self.post = post
+        self.bounds = bounds
+
+    @classmethod
+    def download(cls, pre_ndwi, post_ndwi, region, max_pixels=None):
+        """Download the NDWI of both periods within a region.
+
+        Args:
+            pre_ndwi (ee.Image): NDWI of the pre-event composite.
+            post_ndwi (ee.Image): NDWI of the post-event composite.
+            region (ee.Geometry): The region of interest.
+            max_pixels (int, optional): Pixel budget of the grid, which is never
+                finer than 30 m. Defaults to ``config.NDWI_MAX_PIXELS``.
+
+        Returns:
+            LocalWaterChange: The downloaded arrays.
+        """
+        max_pixels = config.NDWI_MAX_PIXELS if max_pixels is None else max_pixels
+        west, south, east, north = region_bounds(region)
+        x0, y0 = _to_mercator(west, south)
+        x1, y1 = _to_mercator(east, north)
+        # Web Mercator inflates distances by 1 / cos(latitude).
+        min_pixel = 30 / math.cos(math.radians((south + north) / 2))
+        pixel = max(min_pixel, math.sqrt((x1 - x0) * (y1 - y0) / max_pixels))
+        width = max(1, math.ceil((x1 - x0) / pixel))
+        height = max(1, math.ceil((y1 - y0) / pixel))
+
+        def quantize(image):
+            return image.multiply(NDWI_SCALE).round().unmask(NDWI_NODATA).toInt16()
+
+        image = ee.Image.cat(
+            [quantize(pre_ndwi).rename("pre"), quantize(post_ndwi).rename("post")]
+        )
+        request = {
+            "expression": image,
+            "fileFormat": "NUMPY_NDARRAY",
+            "grid": {
+                "dimensions": {"width": width, "height": height},
+                "affineTransform": {
+                    "scaleX": pixel,
+                    "shearX": 0,
+                    "translateX": x0,
+                    "shearY": 0,
+                    "scaleY": -pixel,
+                    "translateY": y1,
+                },
+                "crsCode": "EPSG:3857",
+            },
+        }
+        # Sessions downloading the same NDWI at the same time share one request.
+        key = make_key("ndwi", image.serialize(), request["grid"])
+        pixels = flights.do(key, lambda: ee.data.computePixels(request))
+        west, south = _from_mercator(x0, y1 - height * pixel)
+        east, north = _from_mercator(x0 + width * pixel, y1)
+        return cls(pixels["pre"], pixels["post"], ((south, west), (north, east)))
+
+    def classify(self, threshold):
+        """Classify the water change, like :func:`water_change` does.
+
+        Args:
+            threshold (float): Pixels with a greater NDWI are water.
+
+        Returns:
+            np.ndarray: uint8 classes, with 0 for land and no data.
+        """
+        limit = threshold * NDWI_SCALE
+        # As on Earth Engine, a pixel without data in either period is masked.
+        valid = (self.pre != NDWI_NODATA) & (self.post != NDWI_NODATA)
+        classes = (self.pre > limit).astype(np.uint8)
+        classes += 2 * (self.post > limit).astype(np.uint8)
+        return np.where(valid, classes, 0).astype(np.uint8)
+
+    def water(self, threshold, name):
+        """Return the pixels of a layer of :func:`water_layers`.
+
+        Args:
+            threshold (float): Pixels with a greater NDWI are water.
+            name (str): The name of the layer, in ``WATER_COLORS``.
+
+        Returns:
+            np.ndarray: True for the pixels shown by the layer.
+        """
+        limit = threshold * NDWI_SCALE
+        # No data is below any threshold, but masks the change of a pixel.
+        pre = self.pre > limit
+        post = self.post > limit
+        if name == "Pre-event Water":
+            return pre
+        if name == "Post-event Water":
+            return post
+        classes = self.classify(threshold)
+        if name == "Disappeared Water":
+            return classes == DISAPPEARED_WATER
+        if name == "New Water":
+            return classes == NEW_WATER
+        raise KeyError(name)
+
+    def to_url(self, threshold, name=CHANGE_LAYER):
+        """Render a water layer as a PNG data URL.
+
+        Args:
+            threshold (float): Pixels with a greater NDWI are water.
+            name (str, optional): The layer, ``CHANGE_LAYER`` for the water
+                change in ``CHANGE_COLORS`` or one of ``WATER_COLORS``.
+                Defaults to ``CHANGE_LAYER``.
+
+        Returns:
+            str: The data URL, for an ``ipyleaflet.ImageOverlay``.
+        """
+        if name == CHANGE_LAYER:
+            palette, values = CHANGE_COLORS, self.classify(threshold)
+        else:
+            palette = [WATER_COLORS[name]]
+            values = self.water(threshold, name).astype(np.uint8)
+        colors = np.zeros((len(palette) + 1, 4), dtype=np.uint8)
+        for value, color in enumerate(palette, start=1):
+            colors[value] = [int(color[i : i + 2], 16) for i in (0, 2, 4)] + [255]
+        rgba = colors[values]
+        buffer = io.BytesIO()
+        Image.fromarray(rgba, "RGBA").save(buffer, format="PNG")
+        data = base64.b64encode(buffer.getvalue()).decode("ascii")
+        return f"data:image/png;base64,{data}"
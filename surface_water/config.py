@@ -0,0 +1,113 @@
+"""Runtime settings, read from environment variables at import time."""
+
+import os
+
+
+def _int(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, "") else int(value)
+
+
+def _float(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, "") else float(value)
+
+
+# Size of the process-wide thread pool that runs Earth Engine work.
+MAX_WORKERS = _int("SURFACE_WATER_MAX_WORKERS", 8)
+
+# Directory of the on-disk result cache. Set to an empty string to keep
+# results in memory only.
+CACHE_DIR = os.environ.get(
+    "SURFACE_WATER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "surface_water"),
+)
+
+# Number of results kept in the in-memory tier of each cache.
+CACHE_SIZE = _int("SURFACE_WATER_CACHE_SIZE", 256)
+
+# Regions whose bounding box holds more pixels than this, at the requested
+# scale, are reduced as a grid of tiles.
+TILE_PIXELS = _int("SURFACE_WATER_TILE_PIXELS", 25_000_000)
+
+# Number of Earth Engine requests fanned out by tasks, such as the tiles of a
+# reduction or the periods of a monthly history, that run at the same time
+# across all sessions.
+TILE_CONCURRENCY = _int("SURFACE_WATER_TILE_CONCURRENCY", 4)
+
+# Attempts made after a transient Earth Engine error, with exponential backoff.
+RETRIES = _int("SURFACE_WATER_RETRIES", 3)
+
+# Pixel budgets of the automatic scale of occurrence histograms: the first,
+# coarse histogram and the finest refinement.
+AUTO_FIRST_PIXELS = _int("SURFACE_WATER_AUTO_FIRST_PIXELS", 1_000_000)
+AUTO_MAX_PIXELS = _int("SURFACE_WATER_AUTO_MAX_PIXELS", 100_000_000)
+
+# Estimated occurrence histograms: the half-width of the confidence interval
+# of the share of the region's pixels in any bin, its confidence, and the
+# number of cells of the grid of strata the sample is spread over.
+SAMPLE_MARGIN = _float("SURFACE_WATER_SAMPLE_MARGIN", 0.005)
+SAMPLE_CONFIDENCE = _float("SURFACE_WATER_SAMPLE_CONFIDENCE", 0.95)
+SAMPLE_STRATA = _int("SURFACE_WATER_SAMPLE_STRATA", 16)
+
+# Frames on each side of the current one whose map ids the time slider
+# prefetches, and the number of frame map ids it keeps per slider.
+SLIDER_WINDOW = _int("SURFACE_WATER_SLIDER_WINDOW", 2)
+SLIDER_CACHE = _int("SURFACE_WATER_SLIDER_CACHE", 24)
+
+# Pixel budget of the NDWI arrays downloaded for local threshold retuning.
+NDWI_MAX_PIXELS = _int("SURFACE_WATER_NDWI_MAX_PIXELS", 1_000_000)
+
+# Seconds a map id of a static layer is reused, and the fraction of that time
+# after which it is refreshed in the background.
+MAP_ID_TTL = _int("SURFACE_WATER_MAP_ID_TTL", 4 * 3600)
+MAP_ID_REFRESH = 0.8
+
+# URL path under which surface_water.server mounts the tile proxy. Empty, as
+# when the pages run with `solara run`, to load tiles from Earth Engine.
+TILE_PROXY_PATH = os.environ.get("SURFACE_WATER_TILE_PROXY_PATH", "")
+
+# Directory and size limit of the tile proxy's disk cache.
+TILE_CACHE_DIR = os.environ.get(
+    "SURFACE_WATER_TILE_CACHE_DIR", os.path.join(CACHE_DIR or ".", "tiles")
+)
+TILE_CACHE_BYTES = _int("SURFACE_WATER_TILE_CACHE_BYTES", 1024**3)
+
+# Number of layers the tile proxy keeps registered. The least recently used
+# are forgotten beyond it, and their tiles are only served from the disk cache.
+TILE_PROXY_LAYERS = _int("SURFACE_WATER_TILE_PROXY_LAYERS", 1024)
+
+# Engine of occurrence histograms: "ee" reduces on Earth Engine, "cog" reads a
+# locally staged Cloud-Optimized GeoTIFF of the occurrence band.
+HISTOGRAM_ENGINE = os.environ.get("SURFACE_WATER_HISTOGRAM_ENGINE", "ee")
+OCCURRENCE_COG = os.environ.get("SURFACE_WATER_OCCURRENCE_COG", "")
+
+# Source of the occurrence map tiles: "ee" or "cog", which renders them from
+# OCCURRENCE_COG and requires the tile proxy.
+TILE_ENGINE = os.environ.get("SURFACE_WATER_TILE_ENGINE", "ee")
+
+# Engine of monthly water histories: "ee" or "cube", which reads the locally
+# staged Zarr or NetCDF cube HISTORY_CUBE when it covers the region.
+HISTORY_ENGINE = os.environ.get("SURFACE_WATER_HISTORY_ENGINE", "ee")
+HISTORY_CUBE = os.environ.get("SURFACE_WATER_HISTORY_CUBE", "")
+
+# Years of monthly history computed per Earth Engine request when the chart is
+# streamed. The requests run on the TILE_CONCURRENCY pool. 0 computes the
+# whole history in one request.
+HISTORY_CHUNK_YEARS = _int("SURFACE_WATER_HISTORY_CHUNK_YEARS", 5)
+
+# End of the monthly histories, exclusive, as YYYY-MM-DD. Empty for today.
+HISTORY_END = os.environ.get("SURFACE_WATER_HISTORY_END", "")
+
+# File to which spans of tasks and Earth Engine requests are appended as JSON
+# lines. Tracing is off if empty.
+TRACE_FILE = os.environ.get("SURFACE_WATER_TRACE_FILE", "")
+
+# Sessions whose maps have not been used for this many seconds are evicted; 0
+# keeps them.
+SESSION_IDLE_TIMEOUT = _int("SURFACE_WATER_SESSION_IDLE_TIMEOUT", 2 * 3600)
+# Resident bytes above which the sessions idle the longest are evicted, if they
+# have been idle for at least SESSION_MIN_IDLE seconds; 0 sets no budget.
+MEMORY_BUDGET = _int("SURFACE_WATER_MEMORY_BUDGET", 0)
+SESSION_MIN_IDLE = _int("SURFACE_WATER_SESSION_MIN_IDLE", 300)
+SESSION_SWEEP = _int("SURFACE_WATER_SESSION_SWEEP", 60)
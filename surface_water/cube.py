@@ -0,0 +1,123 @@
+"""JRC monthly water history from a locally staged data cube.
+
+An alternative to Earth Engine for basins that are looked at again and again.
+The cube is a Zarr store or a NetCDF file with a ``water`` variable of the
+monthly history classification (0 no data, 1 not water, 2 water), of
+dimensions ``time``, ``y`` and ``x`` on a regular EPSG:4326 grid, chunked
+along ``y`` and ``x``. Only the chunks intersecting the region are read, and
+the area of every month is summed chunk by chunk in parallel by dask.
+Requires xarray, dask and rasterio.
+"""
+
+import functools
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from .regions import METERS_PER_DEGREE
+
+try:
+    import xarray as xr
+    from rasterio.features import bounds as geometry_bounds
+    from rasterio.features import geometry_mask
+    from rasterio.transform import Affine
+except ImportError:
+    xr = None
+
+WATER = 2
+
+# Radius in meters of the sphere of the same area as the WGS84 ellipsoid.
+_EARTH_RADIUS = 6371007.2
+
+
+def available(path):
+    """Return True if monthly histories can be computed from the cube."""
+    return xr is not None and bool(path) and os.path.exists(path)
+
+
+@functools.lru_cache(maxsize=4)
+def open_cube(path):
+    """Open the ``water`` variable of a cube lazily, once per process.
+
+    Args:
+        path (str): Path of the Zarr store or NetCDF file.
+
+    Returns:
+        xr.DataArray: The cube, backed by dask arrays.
+    """
+    engine = "zarr" if path.rstrip("/").endswith(".zarr") else None
+    return xr.open_dataset(path, engine=engine, chunks={})["water"]
+
+
+def _cell_areas(lats, dx, dy):
+    """Return the area in square meters of grid cells centered on ``lats``."""
+    north = np.radians(lats + dy / 2)
+    south = np.radians(lats - dy / 2)
+    return _EARTH_RADIUS**2 * np.radians(dx) * np.abs(np.sin(north) - np.sin(south))
+
+
+def monthly_history(path, geometry, scale, denominator=1e4):
+    """Compute the water area of every month of the cube within a polygon.
+
+    Args:
+        path (str): Path of the Zarr store or NetCDF file.
+        geometry (dict): GeoJSON geometry of the region, in EPSG:4326.
+        scale (float): Pixel size in meters at which to count pixels. Coarser
+            than the grid of the cube samples every n-th pixel.
+        denominator (float, optional): Converts square meters to the output
+            unit. Defaults to 1e4, i.e. hectares.
+
+    Returns:
+        pd.DataFrame: Like ``geemap.jrc_hist_monthly_history``, image labels
+            in ``Month``, areas in ``Area`` and the month of the year in
+            ``month``, or None if the region is not within the cube.
+    """
+    if xr is None:
+        raise ImportError("The cube engine requires xarray, dask and rasterio.")
+    cube = open_cube(path)
+    x, y = cube["x"].values, cube["y"].values
+    dx, dy = abs(float(x[1] - x[0])), abs(float(y[1] - y[0]))
+    west, south, east, north = geometry_bounds(geometry)
+    if (
+        west < x.min() - dx / 2
+        or east > x.max() + dx / 2
+        or south < y.min() - dy / 2
+        or north > y.max() + dy / 2
+    ):
+        return None
+
+    step = max(1, round(scale / (dx * METERS_PER_DEGREE)))
+    # Rows may run north to south or south to north.
+    ydir = -1 if y[0] > y[-1] else 1
+    rows = slice(north, south) if ydir < 0 else slice(south, north)
+    window = cube.sel(x=slice(west, east), y=rows)
+    window = window.isel(x=slice(None, None, step), y=slice(None, None, step))
+    lons, lats = window["x"].values, window["y"].values
+    if not len(lons) or not len(lats):
+        return None
+
+    # Weights hold the area of every sampled cell inside the polygon.
+    width, height = dx * step, dy * step * ydir
+    transform = Affine(width, 0, lons[0] - width / 2, 0, height, lats[0] - height / 2)
+    inside = geometry_mask(
+        [geometry], out_shape=(len(lats), len(lons)), transform=transform, invert=True
+    )
+    areas = _cell_areas(lats, dx * step, dy * step)[:, None] / denominator
+    weights = xr.DataArray(
+        np.where(inside, areas, 0.0),
+        dims=("y", "x"),
+        coords={"y": lats, "x": lons},
+    )
+    area = ((window == WATER) * weights).sum(dim=("y", "x")).compute()
+
+    times = pd.DatetimeIndex(area["time"].values)
+    labels = [f"{t.year}_{t.month:02d}" for t in times]
+    return pd.DataFrame(
+        {
+            "Month": labels,
+            "Area": area.values.astype(float),
+            "month": [label.split("_")[1] for label in labels],
+        }
+    )
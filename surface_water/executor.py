@@ -0,0 +1,254 @@
+"""Run Earth Engine work triggered by widget callbacks off the UI thread.
+
+Widget callbacks hand their blocking work to a :class:`TaskRunner`. Each
+session (each page ``Map``) owns a runner, while all runners share one bounded
+thread pool so that the number of concurrent Earth Engine calls stays fixed
+no matter how many users are connected. Tasks that fan out into several
+requests, such as the tiles of a reduction, run them on a second shared pool,
+so that fan-out adds at most ``config.TILE_CONCURRENCY`` calls in total.
+Submitting a task under a key that already has a task in flight supersedes
+it: a queued task is dropped, and a running one has its result discarded
+when it finishes.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from . import config, metrics
+
+try:
+    from solara.server import kernel_context
+except ImportError:  # running outside of a Solara server, e.g. in a notebook
+    kernel_context = None
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_fanout_pool = None
+_pool_lock = threading.Lock()
+
+
+class Cancelled(Exception):
+    """Raised by a task that stops early because it was cancelled."""
+
+
+def get_pool():
+    """Return the process-wide worker pool, creating it on first use.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The shared pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=config.MAX_WORKERS, thread_name_prefix="surface-water"
+            )
+        return _pool
+
+
+def get_fanout_pool():
+    """Return the process-wide pool of requests that tasks fan out into.
+
+    Tasks running on :func:`get_pool` wait for these requests, so they get a
+    pool of their own instead of competing with the tasks for workers.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The shared pool, with
+            ``config.TILE_CONCURRENCY`` workers.
+    """
+    global _fanout_pool
+    with _pool_lock:
+        if _fanout_pool is None:
+            _fanout_pool = ThreadPoolExecutor(
+                max_workers=config.TILE_CONCURRENCY,
+                thread_name_prefix="surface-water-fanout",
+            )
+        return _fanout_pool
+
+
+def _current_context():
+    """Return the Solara kernel context of the calling thread, if any."""
+    if kernel_context is None or not kernel_context.has_current_context():
+        return None
+    return kernel_context.get_current_context()
+
+
+def _enter(context):
+    """Enter ``context`` on a pool thread, so widget updates reach its session.
+
+    Pool threads are shared by all sessions and do not inherit a context, so
+    the one captured at submit time has to be entered for every task.
+    """
+    if context is None:
+        return contextlib.nullcontext()
+    return context
+
+
+class Task:
+    """Handle for a unit of work submitted to a :class:`TaskRunner`.
+
+    The task is passed to the submitted function, which can poll
+    :meth:`cancelled` between Earth Engine calls and publish partial results
+    with :meth:`emit`.
+    """
+
+    def __init__(self, key, on_progress=None):
+        self.key = key
+        self.future = None
+        self._on_progress = on_progress
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Cancel the task. Queued work is dropped, running work is ignored."""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelled(self):
+        """Return True if the task was cancelled or superseded."""
+        return self._cancelled.is_set()
+
+    def emit(self, value):
+        """Deliver a partial result to the ``on_progress`` callback.
+
+        Args:
+            value (object): The partial result.
+        """
+        if self._on_progress is not None and not self.cancelled():
+            self._on_progress(value)
+
+
+class TaskRunner:
+    """Runs at most one task per key for a session on the shared pool.
+
+    Args:
+        name (str, optional): Name of the page, under which the tasks are
+            measured. Defaults to None.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        # When work was last submitted or the runner touched, which tells how
+        # idle the session is.
+        self.last_active = time.monotonic()
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, on_done=None, on_error=None, on_progress=None):
+        """Run ``fn(task)`` on the shared pool, superseding any task under ``key``.
+
+        The callbacks are invoked on the pool thread within the session of the
+        caller, and never for a task that has been cancelled or superseded.
+
+        Args:
+            key (str): Identifies the kind of work, e.g. the button that started it.
+            fn (callable): The work to run. Receives the :class:`Task`.
+            on_done (callable, optional): Called with the return value of ``fn``.
+            on_error (callable, optional): Called with the exception raised by
+                ``fn``. Defaults to logging the exception.
+            on_progress (callable, optional): Called with each value passed to
+                :meth:`Task.emit`.
+
+        Returns:
+            Task: The submitted task.
+        """
+        context = _current_context()
+        self.touch()
+        with self._lock:
+            previous = self._tasks.get(key)
+            if previous is not None:
+                previous.cancel()
+            task = Task(key, on_progress=on_progress)
+            self._tasks[key] = task
+            task.future = get_pool().submit(
+                self._run, context, task, fn, on_done, on_error
+            )
+        return task
+
+    def touch(self):
+        """Record a use of the session that starts no work, such as a redraw."""
+        self.last_active = time.monotonic()
+
+    def cancel(self, key=None):
+        """Cancel the task under ``key``, or every task if no key is given.
+
+        Args:
+            key (str, optional): The key of the task to cancel. Defaults to None.
+        """
+        with self._lock:
+            keys = list(self._tasks) if key is None else [key]
+            for k in keys:
+                task = self._tasks.pop(k, None)
+                if task is not None:
+                    task.cancel()
+
+    def running(self, key):
+        """Return True if a task is queued or running under ``key``."""
+        with self._lock:
+            return key in self._tasks
+
+    def wait(self, timeout=None):
+        """Block until no task is queued or running, for scripts and benchmarks.
+
+        Tasks submitted by the callbacks of other tasks are waited for too.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most. Defaults to None.
+
+        Returns:
+            bool: True if all tasks finished, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                futures = [t.future for t in self._tasks.values()]
+            if not futures:
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            wait(futures, timeout=remaining)
+
+    def _run(self, context, task, fn, on_done, on_error):
+        labels = {"page": self.name or "", "task": task.key}
+        try:
+            # The session closed while the task was queued.
+            if context is not None and context.closed_event.is_set():
+                return
+            with _enter(context):
+                self._call(task, fn, on_done, on_error, labels)
+        finally:
+            with self._lock:
+                if self._tasks.get(task.key) is task:
+                    del self._tasks[task.key]
+
+    def _call(self, task, fn, on_done, on_error, labels):
+        if task.cancelled():
+            metrics.TASKS.inc(outcome="cancelled", **labels)
+            return
+        start = time.perf_counter()
+        try:
+            with metrics.span(f"{self.name}.{task.key}"):
+                result = fn(task)
+        except Exception as e:
+            if task.cancelled():
+                metrics.TASKS.inc(outcome="cancelled", **labels)
+                return
+            metrics.TASKS.inc(outcome="error", **labels)
+            if on_error is None:
+                logger.exception("Task %r failed", task.key)
+            else:
+                on_error(e)
+            return
+        finally:
+            metrics.TASK_SECONDS.observe(time.perf_counter() - start, **labels)
+        if task.cancelled():
+            metrics.TASKS.inc(outcome="cancelled", **labels)
+            return
+        metrics.TASKS.inc(outcome="done", **labels)
+        if on_done is not None:
+            on_done(result)
@@ -0,0 +1,493 @@
+"""Statistics of the JRC Global Surface Water datasets within a region.
+
+The datasets are static, so every result is cached by region, scale and
+parameters, and computing it again for the same lake costs nothing.
+"""
+
+import datetime
+import logging
+import math
+from concurrent.futures import as_completed
+
+import ee
+import geemap
+import pandas as pd
+import plotly.express as px
+
+from . import cog, config, cube, regions, sampling
+from .cache import ResultCache, canonical_roi, make_key
+from .executor import Cancelled, get_fanout_pool
+from .reduction import (
+    call_with_retry,
+    estimate_pixels,
+    frequency_histogram,
+    region_bounds,
+)
+
+OCCURRENCE_ID = "JRC/GSW1_4/GlobalSurfaceWater"
+OCCURRENCE_SCALE = 30
+OCCURRENCE_VIS = {
+    "min": 0.0,
+    "max": 100.0,
+    "palette": ["ffffff", "ffbbbb", "0000ff"],
+}
+MONTHLY_HISTORY_ID = "JRC/GSW1_4/MonthlyHistory"
+# First date of the monthly history, as in geemap.jrc_hist_monthly_history.
+MONTHLY_HISTORY_START = "1984-03-16"
+
+_cache = ResultCache("jrc")
+
+logger = logging.getLogger(__name__)
+
+
+def occurrence_image():
+    """Return the water occurrence band of the JRC Global Surface Water."""
+    return ee.Image(OCCURRENCE_ID).select(["occurrence"])
+
+
+def occurrence_tile_renderer():
+    """Return the local renderer of occurrence tiles, if one is configured.
+
+    Returns:
+        callable: Renders a PNG tile from ``z``, ``x`` and ``y`` with
+            ``OCCURRENCE_VIS``, or None to use Earth Engine.
+    """
+    if config.TILE_ENGINE != "cog":
+        return None
+    if not cog.available(config.OCCURRENCE_COG):
+        logger.warning(
+            "Occurrence COG %r is not available, using Earth Engine tiles.",
+            config.OCCURRENCE_COG,
+        )
+        return None
+
+    def render(z, x, y):
+        return cog.render_tile(config.OCCURRENCE_COG, z, x, y, OCCURRENCE_VIS)
+
+    return render
+
+
+def histogram_frame(histogram):
+    """Convert a frequency histogram to the data frame ``geemap`` builds.
+
+    Args:
+        histogram (dict): Pixel values, as strings, mapped to pixel counts.
+
+    Returns:
+        pd.DataFrame: Values in ``key`` and counts in ``value``, sorted by value.
+    """
+    keys = sorted(histogram, key=float)
+    return pd.DataFrame({"key": keys, "value": [histogram[k] for k in keys]})
+
+
+def occurrence_histogram(region, scale, task=None):
+    """Compute the histogram of water occurrence within a region.
+
+    Large regions are reduced as a grid of tiles, see
+    :func:`surface_water.reduction.frequency_histogram`. With
+    ``config.HISTOGRAM_ENGINE`` set to ``cog``, the histogram is computed from
+    the local COG ``config.OCCURRENCE_COG`` instead.
+
+    Args:
+        region (ee.Geometry | ee.FeatureCollection): The region of interest.
+        scale (float): The scale in meters of the reduction.
+        task (surface_water.executor.Task, optional): The task computing the
+            histogram, to stop early when it is cancelled. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Occurrence values in ``key`` and pixel counts in ``value``.
+    """
+    key = make_key(
+        OCCURRENCE_ID,
+        "occurrence",
+        canonical_roi(region),
+        scale,
+        config.HISTOGRAM_ENGINE,
+    )
+
+    def compute():
+        if config.HISTOGRAM_ENGINE == "cog":
+            if cog.available(config.OCCURRENCE_COG):
+                histogram = cog.occurrence_histogram(
+                    config.OCCURRENCE_COG, regions.to_geojson(region), scale
+                )
+                return histogram_frame(histogram)
+            logger.warning(
+                "Occurrence COG %r is not available, using Earth Engine.",
+                config.OCCURRENCE_COG,
+            )
+        histogram = frequency_histogram(
+            occurrence_image(), "occurrence", region, scale, task=task
+        )
+        if task is not None and task.cancelled():
+            raise Cancelled()
+        return histogram_frame(histogram)
+
+    return _cache.get_or_compute(key, compute)
+
+
+def sampled_histogram(region, margin=None, confidence=None):
+    """Estimate the histogram of water occurrence from a stratified sample.
+
+    The cost depends on ``margin`` and ``confidence`` instead of the size of
+    the region, see :mod:`surface_water.sampling`. Occurrence is read at the
+    native scale. Regions with fewer pixels than the sample are reduced
+    exactly instead.
+
+    Args:
+        region (ee.Geometry | ee.FeatureCollection): The region of interest.
+        margin (float, optional): Half-width of the confidence interval of
+            the share of the region's pixels in any bin. Defaults to
+            ``config.SAMPLE_MARGIN``.
+        confidence (float, optional): Confidence of the intervals. Defaults
+            to ``config.SAMPLE_CONFIDENCE``.
+
+    Returns:
+        pd.DataFrame: Occurrence values in ``key``, estimated pixel counts in
+            ``value`` and the half-width of their confidence interval in
+            ``error``, which is missing if the histogram is exact.
+    """
+    margin = config.SAMPLE_MARGIN if margin is None else margin
+    confidence = config.SAMPLE_CONFIDENCE if confidence is None else confidence
+    key = make_key(
+        OCCURRENCE_ID,
+        "sampled_occurrence",
+        canonical_roi(region),
+        margin,
+        confidence,
+        config.SAMPLE_STRATA,
+    )
+
+    def compute():
+        estimates = sampling.sampled_histogram(
+            occurrence_image(),
+            "occurrence",
+            region,
+            OCCURRENCE_SCALE,
+            margin,
+            confidence,
+        )
+        if estimates is None:
+            return occurrence_histogram(region, OCCURRENCE_SCALE)
+        df = histogram_frame({k: value for k, (value, _) in estimates.items()})
+        df["error"] = [estimates[k][1] for k in df["key"]]
+        return df
+
+    return _cache.get_or_compute(key, compute)
+
+
+def auto_scales(region, first_pixels=None, max_pixels=None):
+    """Choose the scales at which to compute an occurrence histogram.
+
+    The first scale keeps the pixel count of the region within
+    ``first_pixels`` so that a first histogram comes back quickly, whatever
+    the size of the region. Each further scale halves the previous one, down
+    to the native 30 m or until the pixel count would exceed ``max_pixels``.
+
+    Args:
+        region (ee.Geometry | ee.FeatureCollection): The region of interest.
+        first_pixels (float, optional): Pixel budget of the first scale.
+            Defaults to ``config.AUTO_FIRST_PIXELS``.
+        max_pixels (float, optional): Pixel budget of the last scale. Defaults
+            to ``config.AUTO_MAX_PIXELS``.
+
+    Returns:
+        list: Scales in meters, from coarse to fine.
+    """
+    first_pixels = config.AUTO_FIRST_PIXELS if first_pixels is None else first_pixels
+    max_pixels = config.AUTO_MAX_PIXELS if max_pixels is None else max_pixels
+    pixels = estimate_pixels(region_bounds(region), OCCURRENCE_SCALE)
+    scale = OCCURRENCE_SCALE * max(1, math.sqrt(pixels / first_pixels))
+    scales = [math.ceil(scale)]
+    while scales[-1] > OCCURRENCE_SCALE:
+        scale = max(OCCURRENCE_SCALE, math.ceil(scales[-1] / 2))
+        if pixels * (OCCURRENCE_SCALE / scale) ** 2 > max_pixels:
+            break
+        scales.append(scale)
+    return scales
+
+
+def progressive_histogram(region, task, scales=None):
+    """Compute occurrence histograms at increasingly fine scales.
+
+    Each histogram is published with ``task.emit((scale, df))`` as soon as it
+    is ready, so that a coarse chart can be shown while the finer ones are
+    still being computed.
+
+    Args:
+        region (ee.Geometry | ee.FeatureCollection): The region of interest.
+        task (surface_water.executor.Task): The task computing the histograms.
+        scales (list, optional): Scales in meters, from coarse to fine.
+            Defaults to :func:`auto_scales` of the region.
+
+    Returns:
+        tuple: The finest scale and its histogram, or None if the task was
+            cancelled before the first one.
+    """
+    if scales is None:
+        scales = auto_scales(region)
+    result = None
+    for scale in scales:
+        if task.cancelled():
+            break
+        result = scale, occurrence_histogram(region, scale, task=task)
+        task.emit(result)
+    return result
+
+
+def history_end():
+    """Return the end of the monthly history, exclusive.
+
+    Returns:
+        str: ``config.HISTORY_END``, or today as in
+            ``geemap.jrc_hist_monthly_history`` if it is empty.
+    """
+    return config.HISTORY_END or datetime.date.today().strftime("%Y-%m-%d")
+
+
+def history_chunks(chunk_years, end_date=None):
+    """Split the monthly history into periods of a few years.
+
+    Args:
+        chunk_years (int): Years per period.
+        end_date (str, optional): End of the history, exclusive. Defaults to
+            :func:`history_end`.
+
+    Returns:
+        list: ``(start_date, end_date)`` pairs, from old to recent, covering
+            the same months as one request for the whole history.
+    """
+    end_date = end_date or history_end()
+    start_year = int(MONTHLY_HISTORY_START[:4])
+    end_year = int(end_date[:4])
+    chunks = []
+    for year in range(start_year, end_year + 1, chunk_years):
+        start = MONTHLY_HISTORY_START if year == start_year else f"{year}-01-01"
+        end = min(f"{year + chunk_years}-01-01", end_date)
+        if start < end:
+            chunks.append((start, end))
+    return chunks
+
+
+def _history_chunk(region, scale, denominator, start_date, end_date):
+    images = (
+        ee.ImageCollection(MONTHLY_HISTORY_ID)
+        .filterDate(start_date, end_date)
+        .map(lambda img: img.eq(2).selfMask())
+    )
+
+    def area(img):
+        return img.set(
+            "area",
+            img.multiply(ee.Image.pixelArea())
+            .divide(denominator)
+            .reduceRegion(
+                reducer=ee.Reducer.sum(),
+                geometry=region,
+                scale=scale,
+                maxPixels=1e12,
+                bestEffort=True,
+            ),
+        )
+
+    areas = images.map(area)
+    # Labels and areas in one request, where geemap makes two.
+    labels, stats = call_with_retry(
+        lambda: ee.List(
+            [areas.aggregate_array("system:index"), areas.aggregate_array("area")]
+        ).getInfo()
+    )
+    return pd.DataFrame(
+        {
+            "Month": labels,
+            "Area": [item["water"] for item in stats],
+            "month": [label.split("_")[1] for label in labels],
+        }
+    )
+
+
+def _concat_history(frames):
+    # Empty periods would turn the areas into objects.
+    frames = [df for df in frames if len(df)]
+    if not frames:
+        return pd.DataFrame({"Month": [], "Area": [], "month": []})
+    return pd.concat(frames, ignore_index=True)
+
+
+def _streamed_history(region, scale, denominator, task, chunk_years):
+    chunks = history_chunks(chunk_years)
+    frames = {}
+    # Periods queue on the pool shared with the tiles of reductions, which
+    # bounds the requests of all sessions together.
+    pool = get_fanout_pool()
+    futures = {
+        pool.submit(_history_chunk, region, scale, denominator, *chunk): chunk
+        for chunk in chunks
+    }
+    try:
+        for future in as_completed(futures):
+            if task.cancelled():
+                raise Cancelled()
+            frames[futures[future]] = future.result()
+            if len(frames) < len(chunks):
+                task.emit(_concat_history(frames[c] for c in sorted(frames)))
+    finally:
+        for future in futures:
+            future.cancel()
+    return _concat_history(frames[c] for c in chunks)
+
+
+def monthly_history(region, scale, denominator=1e4, task=None):
+    """Compute the water area of every month within a region.
+
+    All twelve months of the year are fetched, so that narrowing the months
+    of interest only needs :func:`filter_months` and no further Earth Engine
+    requests. With ``config.HISTORY_ENGINE`` set to ``cube``, regions within
+    the local cube ``config.HISTORY_CUBE`` are computed from it instead.
+
+    Given a task, the history is streamed: it is computed in periods of
+    ``config.HISTORY_CHUNK_YEARS`` years, ``config.TILE_CONCURRENCY`` at a
+    time across all sessions, and the months computed so far are published
+    with ``task.emit(df)`` as every period finishes. The final result is the
+    same either way.
+
+    Args:
+        region (ee.Geometry | ee.FeatureCollection): The region of interest.
+        scale (float): The scale in meters of the reduction.
+        denominator (float, optional): Converts square meters to the output
+            unit. Defaults to 1e4, i.e. hectares.
+        task (surface_water.executor.Task, optional): The task computing the
+            history, to stream it and stop early when it is cancelled.
+            Defaults to None.
+
+    Returns:
+        pd.DataFrame: Image labels in ``Month``, areas in ``Area`` and the
+            month of the year in ``month``.
+    """
+    key = make_key(
+        MONTHLY_HISTORY_ID,
+        "monthly_history",
+        canonical_roi(region),
+        scale,
+        denominator,
+        config.HISTORY_ENGINE,
+    )
+
+    def compute():
+        if config.HISTORY_ENGINE == "cube":
+            df = None
+            if cube.available(config.HISTORY_CUBE):
+                df = cube.monthly_history(
+                    config.HISTORY_CUBE, regions.to_geojson(region), scale, denominator
+                )
+            if df is not None:
+                return df
+            logger.warning(
+                "Cube %r does not cover the region, using Earth Engine.",
+                config.HISTORY_CUBE,
+            )
+        if task is not None and config.HISTORY_CHUNK_YEARS > 0:
+            return _streamed_history(
+                region,
+                scale,
+                denominator,
+                task,
+                config.HISTORY_CHUNK_YEARS,
+            )
+        return geemap.jrc_hist_monthly_history(
+            region=region,
+            scale=scale,
+            frequency="month",
+            start_month=1,
+            end_month=12,
+            end_date=history_end(),
+            denominator=denominator,
+            return_df=True,
+        )
+
+    return _cache.get_or_compute(key, compute)
+
+
+def filter_months(df, start_month, end_month):
+    """Keep the rows of a monthly history within a range of months.
+
+    Like ``ee.Filter.calendarRange``, the range wraps around the end of the
+    year if ``start_month`` is greater than ``end_month``.
+
+    Args:
+        df (pd.DataFrame): The output of :func:`monthly_history`.
+        start_month (int): The first month of the year to keep.
+        end_month (int): The last month of the year to keep.
+
+    Returns:
+        pd.DataFrame: The selected rows.
+    """
+    month = df["month"].astype(int)
+    if start_month <= end_month:
+        mask = (month >= start_month) & (month <= end_month)
+    else:
+        mask = (month >= start_month) | (month <= end_month)
+    return df[mask].reset_index(drop=True)
+
+
+def _bar_chart(
+    df,
+    x,
+    y,
+    x_label=None,
+    y_label=None,
+    title=None,
+    width=None,
+    height=500,
+    layout_args={},
+    error_y=None,
+):
+    labels = {}
+    if x_label is not None:
+        labels[x] = x_label
+    if y_label is not None:
+        labels[y] = y_label
+    fig = px.bar(
+        df,
+        x=x,
+        y=y,
+        error_y=error_y,
+        labels=labels,
+        title=title,
+        width=width,
+        height=height,
+    )
+    fig.update_layout(**layout_args)
+    return fig
+
+
+def histogram_chart(df, **kwargs):
+    """Plot an occurrence histogram the way ``geemap.image_histogram`` does.
+
+    Estimated histograms are plotted with error bars.
+
+    Args:
+        df (pd.DataFrame): The output of :func:`occurrence_histogram` or
+            :func:`sampled_histogram`.
+        **kwargs: ``x_label``, ``y_label``, ``title``, ``width``, ``height``
+            and ``layout_args``.
+
+    Returns:
+        plotly.graph_objects.Figure: The bar chart.
+    """
+    error_y = "error" if "error" in df else None
+    return _bar_chart(df, "key", "value", error_y=error_y, **kwargs)
+
+
+def history_chart(df, **kwargs):
+    """Plot a monthly history the way ``geemap.jrc_hist_monthly_history`` does.
+
+    Args:
+        df (pd.DataFrame): The output of :func:`monthly_history`.
+        **kwargs: ``x_label``, ``y_label``, ``title``, ``width``, ``height``
+            and ``layout_args``.
+
+    Returns:
+        plotly.graph_objects.Figure: The bar chart.
+    """
+    return _bar_chart(df, "Month", "Area", **kwargs)
@@ -0,0 +1,202 @@
+"""Load test the pages with many concurrent simulated sessions.
+
+Every simulated session constructs the ``Map`` of a page, like a browser tab
+opening it, and goes through the interactions of
+:func:`surface_water.benchmark.scenarios`, pausing between them like a user
+would. Sessions run in this process and share its thread pool and caches,
+like the sessions of one server. Earth Engine is replayed from a cassette
+recorded by :mod:`surface_water.benchmark`, so the test runs offline, with a
+simulated latency per request::
+
+    python -m surface_water.benchmark --record benchmark.json
+    python -m surface_water.loadtest benchmark.json --sessions 1 2 4 8 16 32
+
+For every number of sessions, the latency percentiles of interactions,
+throughput, CPU use and memory per session are reported, together with the
+knee of the throughput curve: the number of sessions beyond which adding
+sessions no longer adds throughput. Sessions look at the same region, so all
+but the first hit the result caches, as they would on a server. Every number
+of sessions starts from empty caches and map ids, without the disk tier of the
+caches, see :func:`surface_water.benchmark.isolate`, so that neither earlier
+runs nor the previous number of sessions warm them up.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import benchmark
+from .metrics import rss
+
+logger = logging.getLogger(__name__)
+
+
+def session(module, actions, think_time=0.0, timeout=600, rng=None):
+    """Simulate one session of a page.
+
+    Args:
+        module (module): The page module, see :func:`benchmark.load_page`.
+        actions (list): ``(name, action)`` pairs, see :func:`benchmark.scenarios`.
+        think_time (float, optional): Mean seconds between interactions,
+            exponentially distributed. Defaults to 0.
+        timeout (float, optional): Seconds to wait for the work of one
+            interaction. Defaults to 600.
+        rng (random.Random, optional): Source of think times. Defaults to None.
+
+    Returns:
+        tuple: The map, kept alive by the caller to measure its memory, and
+            ``(interaction, seconds)`` pairs.
+    """
+    rng = rng or random.Random()
+    timings = []
+    m, seconds = benchmark.perform(
+        lambda _: module.Map(**benchmark.MAP_KWARGS), timeout=timeout
+    )
+    timings.append(("Construct map", seconds))
+    for name, action in actions:
+        if think_time:
+            time.sleep(rng.expovariate(1 / think_time))
+        _, seconds = benchmark.perform(action, m, timeout)
+        timings.append((name, seconds))
+    return m, timings
+
+
+def run_level(modules, scenarios, sessions, think_time=0.0, timeout=600, seed=0):
+    """Run concurrent sessions spread over the pages and measure them.
+
+    Args:
+        modules (dict): Page modules by page file name.
+        scenarios (dict): Interactions by page file name.
+        sessions (int): Number of concurrent sessions.
+        think_time (float, optional): See :func:`session`. Defaults to 0.
+        timeout (float, optional): See :func:`session`. Defaults to 600.
+        seed (int, optional): Seed of the think times. Defaults to 0.
+
+    Returns:
+        dict: Sessions that ``failed``, latency percentiles of interactions
+            in seconds, ``throughput`` in interactions per second, ``cpu`` in
+            cores used on average and ``rss_per_session`` in megabytes.
+    """
+    pages = list(modules)
+    gc.collect()
+    rss_before = rss()
+    cpu_before = time.process_time()
+    start = time.perf_counter()
+    lock = threading.Lock()
+    maps, timings = [], []
+
+    def run_session(i):
+        page = pages[i % len(pages)]
+        m, times = session(
+            modules[page],
+            scenarios[page],
+            think_time,
+            timeout,
+            random.Random(seed + i),
+        )
+        with lock:
+            maps.append(m)
+            timings.extend(times)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        for future in [pool.submit(run_session, i) for i in range(sessions)]:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("Session failed: %s", e)
+                failed += 1
+
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_before
+    rss_per_session = (rss() - rss_before) / max(1, len(maps)) / 2**20
+    latencies = np.array([seconds for _, seconds in timings])
+    maps.clear()
+    gc.collect()
+    p50, p95, p99 = (
+        np.percentile(latencies, [50, 95, 99]) if len(latencies) else [0] * 3
+    )
+    return {
+        "sessions": sessions,
+        "failed": failed,
+        "interactions": len(latencies),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "throughput": round(len(latencies) / wall, 3),
+        "cpu": round(cpu / wall, 2),
+        "rss_per_session": round(rss_per_session, 1),
+    }
+
+
+def find_knee(levels, min_gain=0.1):
+    """Return the number of sessions at the knee of the throughput curve.
+
+    Args:
+        levels (pd.DataFrame): Rows of :func:`run_level`, by increasing
+            number of sessions.
+        min_gain (float, optional): Relative throughput gain below which
+            more sessions are not worth it. Defaults to 0.1.
+
+    Returns:
+        int: The last number of sessions that still gained throughput.
+    """
+    knee = int(levels["sessions"].iloc[0])
+    for previous, current in zip(levels.itertuples(), levels.iloc[1:].itertuples()):
+        if current.throughput < previous.throughput * (1 + min_gain):
+            break
+        knee = int(current.sessions)
+    return knee
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m surface_water.loadtest",
+        description="Load test the pages with concurrent simulated sessions.",
+    )
+    parser.add_argument("cassette", help="recorded by surface_water.benchmark")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds")
+    parser.add_argument("--think-time", type=float, default=1.0, help="seconds")
+    parser.add_argument("--pages", nargs="+", help="page file names")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    with open(args.cassette) as f:
+        recorded = json.load(f)
+    transport = benchmark.RecordingTransport(
+        cassette=recorded["responses"], latency=args.latency
+    )
+    end_date = recorded.get("end_date")
+    benchmark.isolate(end_date)
+    benchmark.initialize(transport, recorded["project"])
+    scenarios = benchmark.scenarios(benchmark.DEFAULT_ROI, end_date)
+    modules = {
+        page: benchmark.load_page(page) for page in args.pages or list(scenarios)
+    }
+
+    rows = []
+    for n in sorted(args.sessions):
+        # Cold caches for every level; run_level collects garbage first.
+        benchmark.isolate(end_date)
+        rows.append(run_level(modules, scenarios, n, args.think_time))
+    levels = pd.DataFrame(rows)
+    print(levels.to_string(index=False))
+    print(f"Knee of the throughput curve: {find_knee(levels)} sessions")
+    if transport.misses:
+        print(f"{transport.misses} requests were not recorded in the cassette")
+    if args.output:
+        levels.to_json(args.output, orient="records", indent=2)
+
+
+if __name__ == "__main__":
+    main()
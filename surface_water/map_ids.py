@@ -0,0 +1,212 @@
+"""Process-wide cache of tile URLs of static Earth Engine layers.
+
+Requesting a map id is a round trip to Earth Engine on every page load, even
+for a layer that never changes, such as the JRC water occurrence. Tile URLs
+of static image and visualization combinations are kept here for
+``config.MAP_ID_TTL`` seconds and refreshed in the background before they
+expire, so a page only waits for Earth Engine the first time a layer is used
+in the process.
+
+Map ids of computed images, such as the composites of the compare page, are
+kept by the serialized expression of the image, so that sessions asking for
+the same image share one request. They are not refreshed in the background.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import ee
+import ipyleaflet
+from geemap.coreutils import check_cmap
+
+from . import config, metrics
+from .cache import make_key
+from .singleflight import flights
+from . import tile_proxy
+
+logger = logging.getLogger(__name__)
+
+
+def layer_key(image_fn, vis_params):
+    """Return the key of a static layer, from its image function and vis."""
+    return make_key("map_id", image_fn.__module__, image_fn.__qualname__, vis_params)
+
+
+class MapIdCache:
+    """Tile URLs by layer, refreshed before they expire.
+
+    Args:
+        ttl (float, optional): Seconds a URL is used. Defaults to
+            ``config.MAP_ID_TTL``.
+        refresh (float, optional): Fraction of ``ttl`` after which the URL is
+            refreshed in the background. Defaults to ``config.MAP_ID_REFRESH``.
+        maxsize (int, optional): Number of URLs of computed images kept.
+            Defaults to ``config.CACHE_SIZE``.
+    """
+
+    def __init__(self, ttl=None, refresh=None, maxsize=None):
+        self.ttl = config.MAP_ID_TTL if ttl is None else ttl
+        self.refresh = config.MAP_ID_REFRESH if refresh is None else refresh
+        self.maxsize = config.CACHE_SIZE if maxsize is None else maxsize
+        self._urls = {}
+        self._images = OrderedDict()
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def tile_url(self, image_fn, vis_params):
+        """Return the tile URL of an image, fetching its map id if needed.
+
+        Args:
+            image_fn (callable): Returns the ``ee.Image``. Only called when the
+                map id has to be requested.
+            vis_params (dict): Visualization parameters.
+
+        Returns:
+            str: The tile URL template.
+        """
+        key = layer_key(image_fn, vis_params)
+        with self._lock:
+            entry = self._urls.get(key)
+        if entry is not None and time.time() < entry[1]:
+            metrics.CACHE_REQUESTS.inc(cache="map_ids", result="hit")
+            return entry[0]
+        metrics.CACHE_REQUESTS.inc(cache="map_ids", result="miss")
+        return flights.do(key, lambda: self._fetch(key, image_fn, vis_params))
+
+    def _fetch(self, key, image_fn, vis_params):
+        map_id = image_fn().getMapId(vis_params)
+        url = map_id["tile_fetcher"].url_format
+        with self._lock:
+            self._urls[key] = url, time.time() + self.ttl
+            timer = threading.Timer(
+                self.ttl * self.refresh, self._refresh, (key, image_fn, vis_params)
+            )
+            timer.daemon = True
+            self._timers[key] = timer
+        timer.start()
+        return url
+
+    def image_tile_url(self, image, vis_params):
+        """Return the tile URL of a computed image, fetching its map id if needed.
+
+        Args:
+            image (ee.Image): The image.
+            vis_params (dict): Visualization parameters.
+
+        Returns:
+            str: The tile URL template.
+        """
+        key = make_key("map_id", image.serialize(), vis_params)
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is not None and time.time() < entry[1]:
+                self._images.move_to_end(key)
+                metrics.CACHE_REQUESTS.inc(cache="map_ids", result="hit")
+                return entry[0]
+        metrics.CACHE_REQUESTS.inc(cache="map_ids", result="miss")
+        return flights.do(key, lambda: self._fetch_image(key, image, vis_params))
+
+    def _fetch_image(self, key, image, vis_params):
+        vis_params = dict(vis_params)
+        if "palette" in vis_params:
+            # Palettes may be given by name, as with Map.add_layer.
+            vis_params["palette"] = check_cmap(vis_params["palette"])
+        url = image.getMapId(vis_params)["tile_fetcher"].url_format
+        with self._lock:
+            self._images[key] = url, time.time() + self.ttl
+            self._images.move_to_end(key)
+            while len(self._images) > self.maxsize:
+                self._images.popitem(last=False)
+        return url
+
+    def _refresh(self, key, image_fn, vis_params):
+        try:
+            flights.do(key, lambda: self._fetch(key, image_fn, vis_params))
+        except Exception as e:
+            # The current URL stays in use until it expires, and the next
+            # request after that fetches a new one.
+            logger.warning("Refreshing map id failed: %s", e)
+
+    def clear(self):
+        """Forget every URL and stop the background refreshes."""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._urls.clear()
+            self._images.clear()
+
+
+map_ids = MapIdCache()
+
+
+def static_tile_layer(image_fn, vis_params, name, shown=True, opacity=1.0, render=None):
+    """Create a tile layer of a static image, with a cached map id.
+
+    Args:
+        image_fn (callable): Returns the ``ee.Image``. Must be a module-level
+            function, which identifies the image in the cache.
+        vis_params (dict): Visualization parameters.
+        name (str): Name of the layer.
+        shown (bool, optional): Whether the layer is visible. Defaults to True.
+        opacity (float, optional): Opacity of the layer. Defaults to 1.0.
+        render (callable, optional): Renders the tiles locally from ``z``,
+            ``x`` and ``y``, instead of Earth Engine. Only used when the tile
+            proxy is enabled. Defaults to None.
+
+    Returns:
+        ipyleaflet.TileLayer: The layer.
+    """
+    if render is not None and tile_proxy.enabled():
+        url = tile_proxy.register_renderer(
+            make_key("local", layer_key(image_fn, vis_params))[:32], render
+        )
+        return ipyleaflet.TileLayer(
+            url=url,
+            name=name,
+            visible=shown,
+            opacity=opacity,
+            max_zoom=24,
+        )
+    url = map_ids.tile_url(image_fn, vis_params)
+    if tile_proxy.enabled():
+        # The URL is looked up on every tile cache miss, so that the proxy
+        # follows the refreshes of the map id.
+        url = tile_proxy.register(
+            layer_key(image_fn, vis_params)[:32],
+            lambda: map_ids.tile_url(image_fn, vis_params),
+        )
+    return ipyleaflet.TileLayer(
+        url=url,
+        name=name,
+        attribution="Google Earth Engine",
+        visible=shown,
+        opacity=opacity,
+        max_zoom=24,
+    )
+
+
+def image_tile_layer(image, vis_params, name, shown=True, opacity=1.0):
+    """Create a tile layer of a computed image, with a shared map id.
+
+    Args:
+        image (ee.Image): The image.
+        vis_params (dict): Visualization parameters.
+        name (str): Name of the layer.
+        shown (bool, optional): Whether the layer is visible. Defaults to True.
+        opacity (float, optional): Opacity of the layer. Defaults to 1.0.
+
+    Returns:
+        ipyleaflet.TileLayer: The layer.
+    """
+    url = map_ids.image_tile_url(image, vis_params)
+    return ipyleaflet.TileLayer(
+        url=tile_proxy.proxy_url(url, image, vis_params),
+        name=name,
+        attribution="Google Earth Engine",
+        visible=shown,
+        opacity=opacity,
+        max_zoom=24,
+    )
@@ -0,0 +1,328 @@
+"""Metrics in the Prometheus text format, and optional span traces.
+
+The app records the duration and outcome of the work started by widgets,
+every Earth Engine API request, the hit rates of its caches, and the number
+of sessions and memory of the server. :mod:`surface_water.server` serves them
+at ``/metrics``.
+
+With ``config.TRACE_FILE`` set, every task and the Earth Engine requests it
+makes are also written to that file as spans, one JSON object per line.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def samples(self):
+        with self._lock:
+            return [
+                (self.name, _format_labels(self.labels, k), v)
+                for k, v in self._values.items()
+            ]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A count that only goes up, e.g. of requests."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Add ``amount`` to the count of the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, set directly or read when scraped.
+
+    Args:
+        name (str): Name of the metric.
+        help (str): Description of the metric.
+        fn (callable, optional): Returns the value when the metrics are
+            rendered. Only for gauges without labels. Defaults to None.
+        labels (tuple, optional): Names of the labels. Defaults to ().
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn=None, labels=()):
+        super().__init__(name, help, labels)
+        self._fn = fn
+
+    def set(self, value, **labels):
+        """Set the value of the gauge for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self._fn is not None:
+            try:
+                self.set(self._fn())
+            except Exception as e:
+                logger.warning("Reading gauge %s failed: %s", self.name, e)
+        return super().samples()
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative buckets, e.g. of durations.
+
+    Args:
+        name (str): Name of the metric.
+        help (str): Description of the metric.
+        labels (tuple, optional): Names of the labels. Defaults to ().
+        buckets (tuple, optional): Upper bounds of the buckets. Defaults to
+            ``DEFAULT_BUCKETS``.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """Record one observation for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key, ([0] * len(self.buckets), 0, 0))
+            counts = [c + (value <= b) for c, b in zip(counts, self.buckets)]
+            self._values[key] = counts, total + value, n + 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        samples = []
+        for key, (counts, total, n) in items:
+            for bound, count in zip(self.buckets + ("+Inf",), counts + [n]):
+                labels = _format_labels(self.labels + ("le",), key + (bound,))
+                samples.append((f"{self.name}_bucket", labels, count))
+            labels = _format_labels(self.labels, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, n))
+        return samples
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def rss():
+    """Return the resident memory of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # Peak rather than current memory, where /proc is not available.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def sessions():
+    """Return the number of open Solara sessions of this process."""
+    try:
+        from solara.server import kernel_context
+    except ImportError:
+        return 0
+    return sum(
+        not context.closed_event.is_set()
+        for context in list(kernel_context.contexts.values())
+    )
+
+
+TASK_SECONDS = Histogram(
+    "surface_water_task_seconds",
+    "Duration of the work started by a widget.",
+    ("page", "task"),
+)
+TASKS = Counter(
+    "surface_water_tasks_total",
+    "Work started by widgets, by outcome: done, error or cancelled.",
+    ("page", "task", "outcome"),
+)
+EE_SECONDS = Histogram(
+    "surface_water_ee_request_seconds",
+    "Duration of Earth Engine API requests.",
+    ("method",),
+)
+EE_REQUESTS = Counter(
+    "surface_water_ee_requests_total",
+    "Earth Engine API requests, by outcome: ok, error or timeout.",
+    ("method", "outcome"),
+)
+CACHE_REQUESTS = Counter(
+    "surface_water_cache_requests_total",
+    "Lookups of the result, map id and tile caches, by result: hit or miss.",
+    ("cache", "result"),
+)
+STARTUP_SECONDS = Gauge(
+    "surface_water_startup_seconds",
+    "Seconds spent in each phase of getting the server ready.",
+    labels=("phase",),
+)
+SESSIONS_EVICTED = Counter(
+    "surface_water_sessions_evicted_total",
+    "Sessions evicted, by reason: idle or memory.",
+    ("reason",),
+)
+
+
+def _session_data_bytes():
+    from .sessions import sessions
+
+    return sessions.data_bytes()
+
+
+SESSION_DATA_BYTES = Gauge(
+    "surface_water_session_data_bytes",
+    "Data held by the maps of all sessions, such as downloaded arrays.",
+    _session_data_bytes,
+)
+SESSIONS = Gauge(
+    "surface_water_sessions", "Open Solara sessions of this process.", sessions
+)
+RESIDENT_BYTES = Gauge(
+    "surface_water_resident_bytes", "Resident memory of this process.", rss
+)
+SESSION_RESIDENT_BYTES = Gauge(
+    "surface_water_session_resident_bytes",
+    "Resident memory of this process per open session.",
+    lambda: rss() / max(1, sessions()),
+)
+
+
+# Spans of the current thread, innermost last.
+_spans = threading.local()
+_trace_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Trace the ``with`` block as a span, if ``config.TRACE_FILE`` is set.
+
+    Spans started on the same thread within the block are its children.
+
+    Args:
+        name (str): Name of the span.
+        **attributes: Written with the span.
+    """
+    if not config.TRACE_FILE:
+        yield
+        return
+    stack = _spans.__dict__.setdefault("stack", [])
+    parent = stack[-1] if stack else None
+    record = {
+        "trace": parent["trace"] if parent else uuid.uuid4().hex,
+        "span": uuid.uuid4().hex[:16],
+        "parent": parent["span"] if parent else None,
+        "name": name,
+        "start": time.time(),
+        **attributes,
+    }
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        stack.pop()
+        record["seconds"] = time.perf_counter() - start
+        with _trace_lock:
+            with open(config.TRACE_FILE, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+# Substrings of Earth Engine errors that are timeouts.
+_TIMEOUTS = ("timed out", "timeout", "deadline")
+
+_installed = False
+
+
+def install_ee_hooks():
+    """Measure every Earth Engine API request of this process.
+
+    Wraps the function of the Earth Engine client through which all Cloud
+    API calls go. Calling it again has no effect.
+    """
+    global _installed
+    import ee
+
+    if _installed:
+        return
+    _installed = True
+    execute = ee.data._execute_cloud_call
+
+    def execute_cloud_call(call, num_retries=None):
+        method = getattr(call, "methodId", None) or "unknown"
+        method = method.rsplit("projects.", 1)[-1]
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            with span(f"ee.{method}"):
+                return execute(call, num_retries=num_retries)
+        except Exception as e:
+            message = str(e).lower()
+            outcome = "timeout" if any(t in message for t in _TIMEOUTS) else "error"
+            raise
+        finally:
+            EE_SECONDS.observe(time.perf_counter() - start, method=method)
+            EE_REQUESTS.inc(method=method, outcome=outcome)
+
+    ee.data._execute_cloud_call = execute_cloud_call
@@ -0,0 +1,7 @@
+"""The maps of the app's pages.
+
+Each module holds the ``Map`` and ``Page`` of one page. The files of the
+``pages`` directory only load them when the page is first shown, see
+:func:`surface_water.startup.lazy_page`, so that Solara starts without
+importing Earth Engine and geemap.
+"""
@@ -0,0 +1,429 @@
+import ee
+import geemap
+import ipywidgets as widgets
+import ipyleaflet
+import solara
+from datetime import date
+from surface_water import compare, regions, sessions
+from surface_water.executor import TaskRunner
+from surface_water.map_ids import image_tile_layer
+
+
+def ee_layer(image, vis_params, name, shown=True):
+    # Requests the map id, so it runs in tasks. Sessions with the same inputs
+    # show the same images, so their map ids are shared.
+    return {
+        "ee_object": image,
+        "ee_layer": image_tile_layer(image, vis_params, name, shown),
+        "vis_params": vis_params,
+    }
+
+
+class Map(geemap.Map):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.runner = TaskRunner("compare")
+        # NDWI images of the last Apply, to re-derive the water layers when
+        # the threshold changes, and their local copy once downloaded.
+        self.ndwi_images = None
+        self.local_change = None
+        self.change_legend = None
+        self.add_basemap("Esri.WorldImagery")
+        self.add_gui_widget(add_header=True)
+        sessions.register(self, self.clean_up, self.footprint)
+
+    def footprint(self):
+        if self.local_change is None:
+            return 0
+        return self.local_change.pre.nbytes + self.local_change.post.nbytes
+
+    def show_layers(self, layers):
+        # Like add_layer, with the layers built by ee_layer in a task.
+        for layer in layers:
+            name = layer["ee_layer"].name
+            self.remove(name)
+            self.ee_layers[name] = layer
+            self.add(layer["ee_layer"])
+
+    def clean_up(self):
+        self.ndwi_images = None
+        self.local_change = None
+        # A cancelled download of the NDWI never resets the cursor.
+        self.default_style = {"cursor": "default"}
+        if self.change_legend is not None:
+            self.remove(self.change_legend)
+            self.change_legend = None
+
+        layers = [
+            "Pre-event Image",
+            "Post-event Image",
+            "Pre-event NDWI",
+            "Post-event NDWI",
+            "Pre-event Water",
+            "Post-event Water",
+            "Disappeared Water",
+            "New Water",
+            compare.CHANGE_LAYER,
+        ]
+        for layer_name in layers:
+            if layer_name in self.ee_layers:
+                # Removing by name also removes the legend of the layer.
+                self.remove(layer_name)
+                continue
+            layer = self.find_layer(layer_name)
+            if layer is not None:
+                self.remove(layer)
+
+    def add_gui_widget(self, position="topright", **kwargs):
+
+        widget = widgets.VBox(layout=widgets.Layout(padding="0px 5px 0px 5px"))
+        pre_widget = widgets.HBox()
+        post_widget = widgets.HBox()
+        layout = widgets.Layout(width="auto")
+        style = {"description_width": "initial"}
+        padding = "0px 5px 0px 5px"
+        pre_start_date = widgets.DatePicker(
+            description="Start",
+            value=date(2014, 1, 1),
+            style=style,
+            layout=widgets.Layout(padding=padding, width="160px"),
+        )
+        pre_end_date = widgets.DatePicker(
+            description="End",
+            value=date(2014, 12, 31),
+            style=style,
+            layout=widgets.Layout(padding=padding, width="160px"),
+        )
+        pre_cloud_cover = widgets.IntSlider(
+            description="Cloud",
+            min=0,
+            max=100,
+            value=25,
+            step=1,
+            readout=False,
+            style=style,
+            layout=widgets.Layout(padding=padding, width="130px"),
+        )
+        pre_cloud_label = widgets.Label(value=str(pre_cloud_cover.value))
+        geemap.jslink_slider_label(pre_cloud_cover, pre_cloud_label)
+        pre_widget.children = [
+            pre_start_date,
+            pre_end_date,
+            pre_cloud_cover,
+            pre_cloud_label,
+        ]
+        post_start_date = widgets.DatePicker(
+            description="Start",
+            value=date(2024, 1, 1),
+            style=style,
+            layout=widgets.Layout(padding=padding, width="160px"),
+        )
+        post_end_date = widgets.DatePicker(
+            description="End",
+            value=date(2024, 12, 31),
+            style=style,
+            layout=widgets.Layout(padding=padding, width="160px"),
+        )
+        post_cloud_cover = widgets.IntSlider(
+            description="Cloud",
+            min=0,
+            max=100,
+            value=30,
+            step=1,
+            readout=False,
+            style=style,
+            layout=widgets.Layout(padding=padding, width="130px"),
+        )
+        post_cloud_label = widgets.Label(value=str(post_cloud_cover.value))
+        geemap.jslink_slider_label(post_cloud_cover, post_cloud_label)
+        post_widget.children = [
+            post_start_date,
+            post_end_date,
+            post_cloud_cover,
+            post_cloud_label,
+        ]
+
+        apply_btn = widgets.Button(description="Apply", layout=layout)
+        reset_btn = widgets.Button(description="Reset", layout=layout)
+        buttons = widgets.HBox([apply_btn, reset_btn])
+        output = widgets.Output()
+
+        use_split = widgets.Checkbox(
+            value=False,
+            description="Split map",
+            style=style,
+            layout=widgets.Layout(padding=padding, width="100px"),
+        )
+
+        use_ndwi = widgets.Checkbox(
+            value=False,
+            description="Compute NDWI",
+            style=style,
+            layout=widgets.Layout(padding=padding, width="160px"),
+        )
+
+        ndwi_threhold = widgets.FloatSlider(
+            description="Threshold",
+            min=-1,
+            max=1,
+            value=0,
+            step=0.05,
+            readout=True,
+            style=style,
+            layout=widgets.Layout(padding=padding, width="230px"),
+        )
+
+        use_change = widgets.Checkbox(
+            value=False,
+            description="Change layer",
+            style=style,
+            layout=widgets.Layout(padding=padding, width="140px"),
+        )
+
+        options = widgets.HBox(
+            [
+                use_split,
+                use_ndwi,
+                use_change,
+                ndwi_threhold,
+            ]
+        )
+
+        widget.children = [pre_widget, post_widget, options, buttons, output]
+        self.add_widget(widget, position=position, **kwargs)
+
+        def show_error(e):
+            output.clear_output()
+            output.append_stdout(f"Error: {e}")
+
+        def water_layers(pre_ndwi, post_ndwi, threshold, change):
+            return [
+                ee_layer(*layer)
+                for layer in compare.water_layers(
+                    pre_ndwi, post_ndwi, threshold, change
+                )
+            ]
+
+        def show_water_layers(layers):
+            self.show_layers(layers)
+            if compare.CHANGE_LAYER in self.ee_layers:
+                self.add_legend(
+                    title="Water change",
+                    legend_dict=compare.CHANGE_LEGEND,
+                    layer_name=compare.CHANGE_LAYER,
+                )
+
+        def show_local_change(local_change):
+            # Swap the Earth Engine water layers for image overlays that are
+            # re-rendered locally when the threshold changes.
+            self.runner.cancel("threshold")
+            self.default_style = {"cursor": "default"}
+            self.local_change = local_change
+            threshold = ndwi_threhold.value
+            for name in [compare.CHANGE_LAYER, *compare.WATER_COLORS]:
+                if name not in self.ee_layers:
+                    continue
+                self.remove(name)
+                self.add(
+                    ipyleaflet.ImageOverlay(
+                        url=local_change.to_url(threshold, name),
+                        bounds=local_change.bounds,
+                        name=name,
+                    )
+                )
+                if name == compare.CHANGE_LAYER:
+                    self.add_legend(
+                        title="Water change", legend_dict=compare.CHANGE_LEGEND
+                    )
+                    self.change_legend = self._legend
+
+        def show_download_error(e):
+            # The Earth Engine layers are kept, and retuned by Earth Engine.
+            self.default_style = {"cursor": "default"}
+            output.append_stdout(f"Error downloading NDWI: {e}\n")
+
+        def apply_btn_click(b):
+
+            marker_layer = self.find_layer("Search location")
+            if marker_layer is not None:
+                self.remove(marker_layer)
+            self.runner.cancel()
+            self.runner.touch()
+            self.clean_up()
+
+            if self.user_roi is None:
+                output.clear_output()
+                output.append_stdout("Please draw a ROI first.")
+            elif (
+                pre_start_date.value is None
+                or pre_end_date.value is None
+                or post_start_date.value is None
+                or post_end_date.value is None
+            ):
+                output.clear_output()
+                output.append_stdout("Please select start and end dates.")
+            elif (
+                pre_start_date.value > pre_end_date.value
+                or post_start_date.value > post_end_date.value
+            ):
+                output.clear_output()
+                output.append_stdout("Start dates must be before end dates.")
+
+            elif self.user_roi is not None:
+                output.clear_output()
+                output.append_stdout("Checking available images...")
+                # HLS and Landsat are analysed at 30 m.
+                region = regions.prepare(self.user_roi, 30)
+                roi = ee.FeatureCollection(region)
+                pre_start = pre_start_date.value
+                pre_end = pre_end_date.value
+                pre_cloud = pre_cloud_cover.value
+                post_start = post_start_date.value
+                post_end = post_end_date.value
+                post_cloud = post_cloud_cover.value
+                split = use_split.value
+                ndwi = use_ndwi.value
+                change = use_change.value
+                threshold = ndwi_threhold.value
+
+                def compute(task):
+                    # Only builds the layers: the map is changed by show, which
+                    # is skipped if the task was cancelled or superseded.
+                    # Count the scenes of both periods first, so that an empty
+                    # period is reported before any composite is rendered.
+                    info = compare.availability(
+                        roi,
+                        (pre_start, pre_end, pre_cloud),
+                        (post_start, post_end, post_cloud),
+                    )
+                    task.emit(info)
+                    result = {"info": info, "split": None, "layers": [], "water": []}
+                    if not (info["pre"]["count"] and info["post"]["count"]):
+                        return result
+
+                    vis_params = compare.VIS_PARAMS
+                    pre_img = compare.composite(roi, pre_start, pre_end, pre_cloud)
+                    post_img = compare.composite(roi, post_start, post_end, post_cloud)
+
+                    if split:
+                        result["split"] = (
+                            image_tile_layer(pre_img, vis_params, "Pre-event Image"),
+                            image_tile_layer(post_img, vis_params, "Post-event Image"),
+                        )
+                        return result
+                    result["layers"] = [
+                        ee_layer(pre_img, vis_params, "Pre-event Image"),
+                        ee_layer(post_img, vis_params, "Post-event Image"),
+                    ]
+                    if ndwi:
+                        pre_ndwi = compare.ndwi(pre_img)
+                        post_ndwi = compare.ndwi(post_img)
+                        if not change:
+                            ndwi_vis = compare.NDWI_VIS
+                            result["layers"] += [
+                                ee_layer(pre_ndwi, ndwi_vis, "Pre-event NDWI", False),
+                                ee_layer(post_ndwi, ndwi_vis, "Post-event NDWI", False),
+                            ]
+                        result["water"] = water_layers(
+                            pre_ndwi, post_ndwi, threshold, change
+                        )
+                        result["ndwi"] = pre_ndwi, post_ndwi, change
+                    return result
+
+                def show_availability(info, done=False):
+                    output.clear_output()
+                    output.append_stdout(
+                        compare.describe_availability(
+                            "Pre-event", info["pre"], pre_start
+                        )
+                        + "\n"
+                    )
+                    output.append_stdout(
+                        compare.describe_availability(
+                            "Post-event", info["post"], post_start
+                        )
+                        + "\n"
+                    )
+                    if not done and info["pre"]["count"] and info["post"]["count"]:
+                        output.append_stdout("Computing... Please wait.\n")
+
+                def show(result):
+                    show_availability(result["info"], done=True)
+                    if result["split"] is not None:
+                        self.split_map(
+                            *result["split"],
+                            add_close_button=True,
+                            left_label="Pre-event",
+                            right_label="Post-event",
+                        )
+                    self.show_layers(result["layers"])
+                    show_water_layers(result["water"])
+                    self.ndwi_images = result.get("ndwi")
+                    if self.ndwi_images is not None:
+                        pre_ndwi, post_ndwi, _ = self.ndwi_images
+                        self.default_style = {"cursor": "progress"}
+                        self.runner.submit(
+                            "ndwi",
+                            lambda task: compare.LocalWaterChange.download(
+                                pre_ndwi, post_ndwi, region
+                            ),
+                            on_done=show_local_change,
+                            on_error=show_download_error,
+                        )
+
+                self.runner.submit(
+                    "compare",
+                    compute,
+                    on_done=show,
+                    on_error=show_error,
+                    on_progress=show_availability,
+                )
+
+        apply_btn.on_click(apply_btn_click)
+
+        def threshold_change(change):
+            # Redrawing the local change starts no work, but is a use of the page.
+            self.runner.touch()
+            threshold = change["new"]
+            if self.local_change is not None:
+                for name in [compare.CHANGE_LAYER, *compare.WATER_COLORS]:
+                    layer = self.find_layer(name)
+                    if layer is not None:
+                        layer.url = self.local_change.to_url(threshold, name)
+            elif self.ndwi_images is not None:
+                # Only the water layers depend on the threshold.
+                pre_ndwi, post_ndwi, use_change_layer = self.ndwi_images
+                self.runner.submit(
+                    "threshold",
+                    lambda task: water_layers(
+                        pre_ndwi, post_ndwi, threshold, use_change_layer
+                    ),
+                    on_done=show_water_layers,
+                    on_error=show_error,
+                )
+
+        ndwi_threhold.observe(threshold_change, "value")
+
+        def reset_btn_click(b):
+            self.runner.cancel()
+            self.runner.touch()
+            self.clean_up()
+            self._draw_control.clear()
+            draw_layer = self.find_layer("Drawn Features")
+            if draw_layer is not None:
+                self.remove(draw_layer)
+            output.clear_output()
+
+        reset_btn.on_click(reset_btn_click)
+
+
+@solara.component
+def Page():
+    with solara.Column(style={"min-width": "500px"}):
+        Map.element(
+            center=[20, -0],
+            zoom=2,
+            height="750px",
+            zoom_ctrl=False,
+            measure_ctrl=False,
+        )
@@ -0,0 +1,269 @@
+import geemap
+import ipywidgets as widgets
+from IPython.display import display
+import solara
+from surface_water import config, jrc, regions, sessions
+from surface_water.executor import TaskRunner
+from surface_water.map_ids import static_tile_layer
+
+
+class Map(geemap.Map):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.runner = TaskRunner("jrc")
+        self.add_basemap("Esri.WorldImagery")
+        self.add_ee_data()
+        self.add_buttons(add_header=True)
+        sessions.register(self, self.release, self.footprint)
+
+    def release(self):
+        self.history = None
+        self.remove("Occurrence")
+
+    def footprint(self):
+        if self.history is None:
+            return 0
+        return int(self.history.memory_usage(deep=True).sum())
+
+    def add_ee_data(self):
+
+        # The occurrence layer is static, so its map id is shared by all
+        # sessions instead of being requested on every page load, and its
+        # tiles can be rendered from a local COG instead.
+        image = jrc.occurrence_image()
+        vis_params = jrc.OCCURRENCE_VIS
+        layer = static_tile_layer(
+            jrc.occurrence_image,
+            vis_params,
+            "Occurrence",
+            render=jrc.occurrence_tile_renderer(),
+        )
+        self.add(layer)
+        self.ee_layers["Occurrence"] = {
+            "ee_object": image,
+            "ee_layer": layer,
+            "vis_params": vis_params,
+        }
+        self.add_colorbar(
+            vis_params, label="Water occurrence (%)", layer_name="Occurrence"
+        )
+
+    def add_buttons(self, position="topright", **kwargs):
+        padding = "0px 5px 0px 5px"
+        widget = widgets.VBox(layout=widgets.Layout(padding=padding))
+        layout = widgets.Layout(width="auto")
+        style = {"description_width": "initial"}
+        hist_btn = widgets.Button(description="Occurrence", layout=layout)
+        bar_btn = widgets.Button(description="Monthly history", layout=layout)
+        reset_btn = widgets.Button(description="Reset", layout=layout)
+        scale = widgets.IntSlider(
+            min=30, max=1000, value=90, description="Scale", layout=layout, style=style
+        )
+        auto_scale = widgets.Checkbox(
+            value=False,
+            description="Auto scale",
+            indent=False,
+            layout=widgets.Layout(width="100px"),
+        )
+        estimate = widgets.Checkbox(
+            value=False,
+            description="Estimate",
+            indent=False,
+            layout=widgets.Layout(width="100px"),
+        )
+        month_slider = widgets.IntRangeSlider(
+            description="Months",
+            value=[5, 10],
+            min=1,
+            max=12,
+            step=1,
+            layout=layout,
+            style=style,
+        )
+        widget.children = [
+            widgets.HBox([hist_btn, bar_btn, reset_btn]),
+            month_slider,
+            widgets.HBox([scale, auto_scale, estimate]),
+        ]
+        self.add_widget(widget, position=position, **kwargs)
+        output = widgets.Output()
+        self.add_widget(output, position="bottomleft", add_header=False)
+
+        # Monthly history of the current chart, re-filtered locally when the
+        # month range changes.
+        self.history = None
+
+        def show_chart(chart):
+            with output:
+                output.clear_output()
+                display(chart)
+            self.default_style = {"cursor": "default"}
+
+        def show_error(e):
+            output.clear_output()
+            output.append_stdout(f"Error: {e}")
+            self.default_style = {"cursor": "default"}
+
+        def history_chart(df, title=None):
+            return jrc.history_chart(
+                jrc.filter_months(df, *month_slider.value),
+                height=350,
+                width=550,
+                title=title,
+                y_label="Area (ha)",
+                layout_args={
+                    "title": dict(x=0.5),
+                    "margin": dict(l=0, r=0, t=10 if title is None else 40, b=0),
+                },
+            )
+
+        def show_history(df):
+            self.history = df
+            show_chart(history_chart(df))
+
+        def hist_btn_click(b):
+            region = self.user_roi
+            if region is not None:
+                self.history = None
+                output.clear_output()
+                output.append_stdout("Computing histogram...")
+                self.default_style = {"cursor": "wait"}
+                scale_value = scale.value
+
+                def chart(df, title=None):
+                    return jrc.histogram_chart(
+                        df,
+                        height=350,
+                        width=550,
+                        title=title,
+                        x_label="Water Occurrence (%)",
+                        y_label="Pixel Count",
+                        layout_args={
+                            "title": dict(x=0.5),
+                            "margin": dict(
+                                l=0, r=0, t=10 if title is None else 40, b=0
+                            ),
+                        },
+                    )
+
+                if estimate.value:
+                    # A histogram from a sample of the region, whose cost does
+                    # not grow with its size, with error bars.
+                    def compute(task):
+                        roi = regions.prepare(region, jrc.OCCURRENCE_SCALE)
+                        df = jrc.sampled_histogram(roi)
+                        if "error" not in df:
+                            return chart(df)
+                        confidence = f"{config.SAMPLE_CONFIDENCE:.0%}"
+                        return chart(df, f"Estimate, {confidence} confidence")
+
+                    self.runner.submit(
+                        "chart", compute, on_done=show_chart, on_error=show_error
+                    )
+                elif auto_scale.value:
+                    # Show a coarse histogram right away and replace it as
+                    # finer scales finish.
+                    scales = []
+
+                    def compute(task):
+                        roi = regions.prepare(region, jrc.OCCURRENCE_SCALE)
+                        scales.extend(jrc.auto_scales(roi))
+                        return jrc.progressive_histogram(roi, task, scales)
+
+                    def show_level(result):
+                        level, df = result
+                        if level != scales[-1]:
+                            show_chart(chart(df, f"Scale: {level} m (refining...)"))
+                            self.default_style = {"cursor": "progress"}
+
+                    def show_final(result):
+                        level, df = result
+                        show_chart(chart(df, f"Scale: {level} m"))
+
+                    self.runner.submit(
+                        "chart",
+                        compute,
+                        on_done=show_final,
+                        on_error=show_error,
+                        on_progress=show_level,
+                    )
+                else:
+
+                    def compute(task):
+                        roi = regions.prepare(region, scale_value)
+                        df = jrc.occurrence_histogram(roi, scale_value, task=task)
+                        return chart(df)
+
+                    self.runner.submit(
+                        "chart", compute, on_done=show_chart, on_error=show_error
+                    )
+            else:
+                output.clear_output()
+                with output:
+                    output.append_stdout("Please draw a region of interest first.")
+
+        hist_btn.on_click(hist_btn_click)
+
+        def bar_btn_click(b):
+            region = self.user_roi
+            if region is not None:
+                self.default_style = {"cursor": "wait"}
+                output.clear_output()
+                output.append_stdout("Computing monthly history...")
+                scale_value = scale.value
+
+                def compute(task):
+                    roi = regions.prepare(region, scale_value)
+                    return jrc.monthly_history(
+                        roi, scale_value, denominator=1e4, task=task
+                    )
+
+                # Show the years computed so far while the others are still
+                # running.
+                def show_partial(df):
+                    show_chart(history_chart(df, "Loading more years..."))
+                    self.default_style = {"cursor": "progress"}
+
+                self.runner.submit(
+                    "chart",
+                    compute,
+                    on_done=show_history,
+                    on_error=show_error,
+                    on_progress=show_partial,
+                )
+            else:
+                output.clear_output()
+                with output:
+                    output.append_stdout("Please draw a region of interest first.")
+
+        bar_btn.on_click(bar_btn_click)
+
+        def month_slider_change(change):
+            # Redrawing the chart starts no work, but is a use of the page.
+            self.runner.touch()
+            if self.history is not None and not self.runner.running("chart"):
+                show_chart(history_chart(self.history))
+
+        month_slider.observe(month_slider_change, "value")
+
+        def reset_btn_click(b):
+            self.runner.cancel()
+            self.runner.touch()
+            self.history = None
+            self.default_style = {"cursor": "default"}
+            self._draw_control.clear()
+            output.clear_output()
+
+        reset_btn.on_click(reset_btn_click)
+
+
+@solara.component
+def Page():
+    with solara.Column(style={"min-width": "500px"}):
+        Map.element(
+            center=[20, -0],
+            zoom=2,
+            height="750px",
+            zoom_ctrl=False,
+            measure_ctrl=False,
+        )
@@ -0,0 +1,309 @@
+import logging
+import geemap
+import ipywidgets as widgets
+import solara
+from geemap import get_current_year, jslink_slider_label
+from surface_water import regions, sessions
+from surface_water.executor import TaskRunner
+from surface_water.time_slider import add_time_slider
+from surface_water.timeseries import TimeSeriesMemo
+
+logger = logging.getLogger(__name__)
+
+
+class Map(geemap.Map):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.runner = TaskRunner("timeseries")
+        self.series = TimeSeriesMemo()
+        # The ROI of the last time series, kept after the drawing is cleared
+        # so that the views can be switched without drawing it again.
+        self.roi = None
+        # The time series shown by the time slider, if any.
+        self.slider_series = None
+        self.add_basemap("Esri.WorldImagery")
+        self.add_ts_gui(position="topright")
+        sessions.register(self, self.release)
+
+    def release(self):
+        self.clean_up()
+        self.series.clear()
+
+    def clean_up(self):
+        self.roi = None
+        self.slider_series = None
+        if hasattr(self, "slider_ctrl") and self.slider_ctrl is not None:
+            self.remove(self.slider_ctrl)
+            delattr(self, "slider_ctrl")
+
+        layer = self.find_layer("Image X")
+        if layer is not None:
+            self.remove(layer)
+
+        draw_layer = self.find_layer("Drawn Features")
+        if draw_layer is not None:
+            self.remove(draw_layer)
+
+    def add_ts_gui(self, position="topright", **kwargs):
+
+        widget_width = "350px"
+        padding = "0px 0px 0px 5px"  # upper, right, bottom, left
+        style = {"description_width": "initial"}
+        current_year = get_current_year()
+
+        collection = widgets.Dropdown(
+            options=[
+                "Landsat TM-ETM-OLI Surface Reflectance",
+            ],
+            value="Landsat TM-ETM-OLI Surface Reflectance",
+            description="Collection:",
+            layout=widgets.Layout(width=widget_width, padding=padding),
+            style=style,
+        )
+        bands = widgets.Dropdown(
+            description="Bands:",
+            options=[
+                "Red/Green/Blue",
+                "NIR/Red/Green",
+                "SWIR2/SWIR1/NIR",
+                "NIR/SWIR1/Red",
+                "SWIR2/NIR/Red",
+                "SWIR2/SWIR1/Red",
+                "SWIR1/NIR/Blue",
+                "NIR/SWIR1/Blue",
+                "SWIR2/NIR/Green",
+                "SWIR1/NIR/Red",
+            ],
+            value="SWIR1/NIR/Red",
+            style=style,
+            layout=widgets.Layout(width="195px", padding=padding),
+        )
+
+        frequency = widgets.Dropdown(
+            description="Frequency:",
+            options=["year", "quarter", "month"],
+            value="year",
+            style=style,
+            layout=widgets.Layout(width="150px", padding=padding),
+        )
+
+        start_year = widgets.IntSlider(
+            description="Start Year:",
+            value=1984,
+            min=1984,
+            max=current_year,
+            readout=False,
+            style=style,
+            layout=widgets.Layout(width="138px", padding=padding),
+        )
+
+        start_year_label = widgets.Label("1984")
+        jslink_slider_label(start_year, start_year_label)
+
+        end_year = widgets.IntSlider(
+            description="End Year:",
+            value=current_year,
+            min=1984,
+            max=current_year,
+            readout=False,
+            style=style,
+            layout=widgets.Layout(width="138px", padding=padding),
+        )
+        end_year_label = widgets.Label(str(current_year))
+        jslink_slider_label(end_year, end_year_label)
+
+        start_month = widgets.IntSlider(
+            description="Start Month:",
+            value=5,
+            min=1,
+            max=12,
+            readout=False,
+            style=style,
+            layout=widgets.Layout(width="145px", padding=padding),
+        )
+
+        start_month_label = widgets.Label(
+            "5",
+            layout=widgets.Layout(width="20px", padding=padding),
+        )
+        jslink_slider_label(start_month, start_month_label)
+
+        end_month = widgets.IntSlider(
+            description="End Month:",
+            value=10,
+            min=1,
+            max=12,
+            readout=False,
+            style=style,
+            layout=widgets.Layout(width="155px", padding=padding),
+        )
+
+        end_month_label = widgets.Label("10")
+        jslink_slider_label(end_month, end_month_label)
+
+        output = widgets.Output()
+
+        button_width = "113px"
+        apply_btn = widgets.Button(
+            description="Time slider",
+            button_style="primary",
+            tooltip="Click to create timeseries",
+            style=style,
+            layout=widgets.Layout(padding="0px", width=button_width),
+        )
+
+        split_btn = widgets.Button(
+            description="Split map",
+            button_style="primary",
+            tooltip="Click to create timeseries",
+            style=style,
+            layout=widgets.Layout(padding="0px", width=button_width),
+        )
+
+        reset_btn = widgets.Button(
+            description="Reset",
+            button_style="primary",
+            style=style,
+            layout=widgets.Layout(padding="0px", width=button_width),
+        )
+
+        vbox = widgets.VBox(
+            [
+                collection,
+                widgets.HBox([bands, frequency]),
+                widgets.HBox([start_year, start_year_label, end_year, end_year_label]),
+                widgets.HBox(
+                    [start_month, start_month_label, end_month, end_month_label]
+                ),
+                widgets.HBox([apply_btn, split_btn, reset_btn]),
+                output,
+            ]
+        )
+        self.add_widget(vbox, position=position, add_header=True)
+
+        def show_error(e):
+            output.clear_output()
+            output.append_stdout(f"Error: {e}")
+
+        def vis_params():
+            return {
+                "bands": bands.value.split("/"),
+                "min": 0,
+                "max": 0.4,
+            }
+
+        def remove_slider():
+            if hasattr(self, "slider_ctrl") and self.slider_ctrl is not None:
+                self.remove(self.slider_ctrl)
+                delattr(self, "slider_ctrl")
+
+        def clear_drawing():
+            try:
+                self._draw_control.clear()
+                draw_layer = self.find_layer("Drawn Features")
+                if draw_layer is not None:
+                    self.remove(draw_layer)
+            except Exception as e:
+                logger.warning("Clearing the drawing failed: %s", e)
+
+        # Resolves the time series of the widgets' values, then calls show.
+        def submit(show):
+            self.runner.touch()
+            with output:
+                output.clear_output()
+                if self.user_roi is not None:
+                    # Landsat is analysed at 30 m.
+                    self.roi = regions.prepare(self.user_roi, 30)
+                if self.roi is None:
+                    output.append_stdout("Please draw a ROI first.")
+                    return
+                output.append_stdout("Creating time series...")
+                args = (
+                    self.roi,
+                    start_year.value,
+                    end_year.value,
+                    start_month.value,
+                    end_month.value,
+                    frequency.value,
+                )
+
+                def compute(task):
+                    series = self.series.get(*args)
+                    series.dates()
+                    return series
+
+                self.runner.submit(
+                    "timeseries", compute, on_done=show, on_error=show_error
+                )
+
+        def show_slider(series):
+            remove_slider()
+            add_time_slider(
+                self,
+                series.collection,
+                series.dates(),
+                vis_params=vis_params(),
+                region=series.roi,
+            )
+            self.slider_series = series
+            clear_drawing()
+            output.clear_output()
+
+        def apply_btn_click(change):
+            remove_slider()
+            self.slider_series = None
+            submit(show_slider)
+
+        apply_btn.on_click(apply_btn_click)
+
+        def show_split(series):
+            self.ts_inspector(
+                series.collection,
+                left_names=series.dates(),
+                left_vis=vis_params(),
+                add_close_button=True,
+            )
+            output.clear_output()
+            clear_drawing()
+
+        def split_btn_click(change):
+            remove_slider()
+            self.slider_series = None
+            submit(show_split)
+
+        split_btn.on_click(split_btn_click)
+
+        def bands_change(change):
+            self.runner.touch()
+            # Only the visualization changes, the time series is reused.
+            series = self.slider_series
+            slider_ctrl = getattr(self, "slider_ctrl", None)
+            if series is not None and slider_ctrl in self.controls:
+                self.runner.submit(
+                    "timeseries",
+                    lambda task: series,
+                    on_done=show_slider,
+                    on_error=show_error,
+                )
+
+        bands.observe(bands_change, "value")
+
+        def reset_btn_click(change):
+            self.runner.cancel()
+            self.runner.touch()
+            output.clear_output()
+            self.clean_up()
+
+        reset_btn.on_click(reset_btn_click)
+
+
+@solara.component
+def Page():
+    with solara.Column(style={"min-width": "500px"}):
+        Map.element(
+            center=[20, -0],
+            zoom=2,
+            height="750px",
+            zoom_ctrl=False,
+            measure_ctrl=False,
+        )
@@ -0,0 +1,222 @@
+"""Histogram reductions of large regions, split into tiles.
+
+A single ``reduceRegion`` over a large basin at a fine scale runs into Earth
+Engine's pixel, memory and time limits. Here the bounding box of the region
+is cut into a grid of tiles whose pixel count stays below
+``config.TILE_PIXELS``. The tiles are reduced concurrently, on a pool shared
+by all sessions, and each partial frequency histogram is merged by summing
+the counts of equal values, which gives the same result as one reduction over
+the whole region. A tile that still fails for lack of capacity is split
+again.
+"""
+
+import math
+import random
+import time
+from collections import Counter
+from concurrent.futures import as_completed
+
+import ee
+
+from . import config
+from .executor import get_fanout_pool
+from .regions import METERS_PER_DEGREE
+
+# Substrings of Earth Engine errors that are worth retrying as is.
+_TRANSIENT_ERRORS = (
+    "too many concurrent",
+    "rate limit",
+    "quota exceeded",
+    "internal error",
+    "service unavailable",
+    "429",
+    "503",
+)
+
+# Substrings of Earth Engine errors that call for a smaller tile.
+_CAPACITY_ERRORS = (
+    "memory limit",
+    "timed out",
+    "too many pixels",
+)
+
+# How many times a failing tile may be split into quarters.
+MAX_SPLIT_DEPTH = 3
+
+
+def _matches(error, patterns):
+    message = str(error).lower()
+    return any(p in message for p in patterns)
+
+
+def call_with_retry(fn, retries=None, backoff=1.0):
+    """Call ``fn``, retrying transient Earth Engine errors with backoff.
+
+    Args:
+        fn (callable): Makes the Earth Engine request. Called without arguments.
+        retries (int, optional): Number of retries. Defaults to ``config.RETRIES``.
+        backoff (float, optional): Delay in seconds before the first retry,
+            doubled for each further one. Defaults to 1.0.
+
+    Returns:
+        object: The return value of ``fn``.
+    """
+    retries = config.RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except ee.EEException as e:
+            if attempt == retries or not _matches(e, _TRANSIENT_ERRORS):
+                raise
+            time.sleep(backoff * 2**attempt * (1 + random.random()))
+
+
+def _geometry(region):
+    if isinstance(region, (ee.FeatureCollection, ee.Feature)):
+        return region.geometry()
+    return region
+
+
+def _positions(coords):
+    if coords and isinstance(coords[0], (int, float)):
+        yield coords
+    else:
+        for c in coords:
+            yield from _positions(c)
+
+
+def region_bounds(region):
+    """Return the bounding box of a region as ``[west, south, east, north]``.
+
+    The box of a client-side geometry is computed locally. Any other region
+    costs one Earth Engine request.
+
+    Args:
+        region (ee.Geometry | ee.Feature | ee.FeatureCollection): The region.
+
+    Returns:
+        list: The bounds in degrees.
+    """
+    try:
+        geojson = region.toGeoJSON()
+        geometries = geojson.get("geometries", [geojson])
+        positions = [p for g in geometries for p in _positions(g["coordinates"])]
+    except Exception:
+        geojson = _geometry(region).bounds().getInfo()
+        positions = list(_positions(geojson["coordinates"]))
+    xs = [p[0] for p in positions]
+    ys = [p[1] for p in positions]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def estimate_pixels(bounds, scale):
+    """Estimate the number of pixels within a bounding box at a scale.
+
+    Args:
+        bounds (list): ``[west, south, east, north]`` in degrees.
+        scale (float): The scale in meters.
+
+    Returns:
+        float: An upper bound of the pixel count of the region.
+    """
+    west, south, east, north = bounds
+    latitude = math.radians((south + north) / 2)
+    width = (east - west) * METERS_PER_DEGREE * math.cos(latitude)
+    height = (north - south) * METERS_PER_DEGREE
+    return max(width, 0) * max(height, 0) / scale**2
+
+
+def split_bounds(bounds, rows, cols):
+    """Cut a bounding box into a grid of ``rows`` by ``cols`` boxes.
+
+    Args:
+        bounds (list): ``[west, south, east, north]`` in degrees.
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+
+    Returns:
+        list: The bounds of the tiles.
+    """
+    west, south, east, north = bounds
+    dx = (east - west) / cols
+    dy = (north - south) / rows
+    return [
+        [west + i * dx, south + j * dy, west + (i + 1) * dx, south + (j + 1) * dy]
+        for j in range(rows)
+        for i in range(cols)
+    ]
+
+
+def merge_histograms(histograms):
+    """Sum frequency histograms bin by bin.
+
+    Args:
+        histograms (iterable): Dictionaries of value to count. None stands for
+            an empty histogram.
+
+    Returns:
+        dict: The merged histogram.
+    """
+    total = Counter()
+    for histogram in histograms:
+        total.update(histogram or {})
+    return dict(total)
+
+
+def _reduce_tile(image, band, bounds, geometry, scale, depth=0):
+    tile = ee.Geometry.Rectangle(bounds, "EPSG:4326", False).intersection(
+        geometry, ee.ErrorMargin(1)
+    )
+    histogram = image.reduceRegion(
+        reducer=ee.Reducer.frequencyHistogram(),
+        geometry=tile,
+        scale=scale,
+        maxPixels=1e13,
+    ).get(band)
+    try:
+        return call_with_retry(histogram.getInfo)
+    except ee.EEException as e:
+        if depth >= MAX_SPLIT_DEPTH or not _matches(e, _CAPACITY_ERRORS):
+            raise
+        return merge_histograms(
+            _reduce_tile(image, band, b, geometry, scale, depth + 1)
+            for b in split_bounds(bounds, 2, 2)
+        )
+
+
+def frequency_histogram(image, band, region, scale, task=None):
+    """Compute the frequency histogram of a band within a region, tile by tile.
+
+    Args:
+        image (ee.Image): The image.
+        band (str): The band to reduce.
+        region (ee.Geometry | ee.Feature | ee.FeatureCollection): The region.
+        scale (float): The scale in meters of the reduction.
+        task (surface_water.executor.Task, optional): Stops scheduling tiles
+            once the task is cancelled. Defaults to None.
+
+    Returns:
+        dict: Pixel values, as strings, mapped to pixel counts.
+    """
+    image = image.select([band])
+    geometry = _geometry(region)
+    bounds = region_bounds(region)
+    tiles = math.ceil(estimate_pixels(bounds, scale) / config.TILE_PIXELS)
+    if tiles <= 1:
+        return _reduce_tile(image, band, bounds, geometry, scale) or {}
+
+    side = math.ceil(math.sqrt(tiles))
+    grid = split_bounds(bounds, side, side)
+    # Tiles of all sessions share one bounded pool.
+    pool = get_fanout_pool()
+    futures = [pool.submit(_reduce_tile, image, band, b, geometry, scale) for b in grid]
+    histograms = []
+    try:
+        for future in as_completed(futures):
+            if task is not None and task.cancelled():
+                break
+            histograms.append(future.result())
+    finally:
+        for future in futures:
+            future.cancel()
+    return merge_histograms(histograms)
@@ -0,0 +1,126 @@
+"""Prepare regions of interest before any Earth Engine work.
+
+Drawn or uploaded polygons can have thousands of vertices, every one of which
+is sent with each request and slows down clipping and reductions. A region is
+prepared once, client-side: invalid polygons are repaired, vertices closer
+than half the analysis scale are simplified away, coordinates are snapped to
+a grid of ``GRID`` degrees and the rings are put in a canonical order, so
+that the same shape always gives the same geometry and cache key.
+"""
+
+import logging
+
+import ee
+import shapely
+from shapely.geometry import mapping, shape
+
+logger = logging.getLogger(__name__)
+
+# Coordinates are snapped to this many degrees (about 10 cm at the equator)
+# so that the same drawn shape always hashes to the same key.
+GRID = 1e-6
+
+# Approximate length in meters of one degree of latitude, or of longitude at
+# the equator.
+METERS_PER_DEGREE = 111_320
+
+
+def to_geojson(region):
+    """Return the GeoJSON geometry of a region, fetching it only if needed.
+
+    Args:
+        region (ee.Geometry | ee.Feature | ee.FeatureCollection | dict): The
+            region, or its GeoJSON geometry.
+
+    Returns:
+        dict: The geometry in EPSG:4326.
+    """
+    if isinstance(region, dict):
+        return region.get("geometry", region)
+    try:
+        return region.toGeoJSON()
+    except Exception:
+        return region.geometry().getInfo()
+
+
+def repair(geometry):
+    """Make a shapely geometry valid, keeping only its polygons if it has any."""
+    if geometry.is_valid:
+        return geometry
+    repaired = shapely.make_valid(geometry)
+    polygons = [
+        g
+        for g in getattr(repaired, "geoms", [repaired])
+        if g.geom_type in ("Polygon", "MultiPolygon")
+    ]
+    return shapely.union_all(polygons) if polygons else repaired
+
+
+def canonical(geometry, scale=None):
+    """Return the canonical form of a GeoJSON geometry.
+
+    Args:
+        geometry (dict): GeoJSON geometry in EPSG:4326.
+        scale (float, optional): Analysis scale in meters. Vertices within
+            half of it are simplified away. Defaults to None, i.e. no
+            simplification.
+
+    Returns:
+        shapely.Geometry: The repaired, simplified, snapped and normalized
+            geometry.
+    """
+    original = repair(shape(geometry))
+    result = original
+    if scale:
+        tolerance = scale / 2 / METERS_PER_DEGREE
+        simplified = result.simplify(tolerance, preserve_topology=True)
+        # A region smaller than the tolerance is kept as drawn.
+        if not simplified.is_empty and simplified.area >= original.area / 2:
+            result = simplified
+    result = shapely.set_precision(result, GRID)
+    if result.is_empty:
+        result = original
+    return shapely.normalize(result)
+
+
+def canonical_geojson(geometry, scale=None):
+    """Return the canonical form of a GeoJSON geometry as GeoJSON.
+
+    See :func:`canonical` for the arguments. The ``geodesic`` flag of Earth
+    Engine geometries is kept, since it changes the region covered.
+    """
+    result = mapping(canonical(geometry, scale))
+    result = {"type": result["type"], "coordinates": _lists(result["coordinates"])}
+    if geometry.get("geodesic") is not None:
+        result["geodesic"] = geometry["geodesic"]
+    return result
+
+
+def _lists(coords):
+    if isinstance(coords, (list, tuple)):
+        return [_lists(c) for c in coords]
+    return coords
+
+
+def prepare(region, scale):
+    """Return the canonical geometry of a region, simplified for a scale.
+
+    Args:
+        region (ee.Geometry | ee.Feature | ee.FeatureCollection | dict): The
+            region, e.g. ``Map.user_roi``, or its GeoJSON geometry.
+        scale (float): Analysis scale in meters.
+
+    Returns:
+        ee.Geometry: The geometry to use in Earth Engine requests, with
+            geodesic or planar edges like the region. Edges of GeoJSON
+            geometries are geodesic, the default of Earth Engine.
+    """
+    geometry = to_geojson(region)
+    prepared = canonical_geojson(geometry, scale)
+    logger.debug(
+        "Prepared a %s of %d vertices into %d",
+        geometry["type"],
+        shapely.get_num_coordinates(shape(geometry)),
+        shapely.get_num_coordinates(shape(prepared)),
+    )
+    return ee.Geometry(prepared)
@@ -0,0 +1,209 @@
+"""Frequency histograms estimated from a stratified random sample.
+
+An exact histogram reduces every pixel of the region, so its cost grows
+with the area. Here the region is cut into a grid of strata, random points
+are allocated to the strata in proportion to their area, and the value of
+the image is read at every point. The share of every value in the region is
+estimated from the shares within the strata, weighted by their area, with a
+confidence interval from the stratified variance. The number of points only
+depends on the requested precision, see :func:`sample_size`.
+"""
+
+import math
+from statistics import NormalDist
+
+import ee
+import shapely
+from shapely.geometry import box, mapping
+
+from . import config, regions
+from .reduction import call_with_retry, split_bounds
+from .regions import METERS_PER_DEGREE
+
+# Value given to points where the image is masked. They count towards the
+# area of the region but not towards any bin.
+MASKED = -1
+
+
+def sample_size(margin, confidence=0.95):
+    """Return the number of points that estimate any share within a margin.
+
+    Uses the worst case of a share of one half, so the margin holds for
+    every bin of the histogram.
+
+    Args:
+        margin (float): Half-width of the confidence interval of a share,
+            e.g. 0.005 for half a percentage point of the region's pixels.
+        confidence (float, optional): Confidence of the interval. Defaults
+            to 0.95.
+
+    Returns:
+        int: The number of points.
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return math.ceil(z**2 * 0.25 / margin**2)
+
+
+def _area(geometry):
+    # Square meters, with degrees of longitude shortened at the centroid.
+    latitude = math.radians(geometry.centroid.y)
+    return geometry.area * METERS_PER_DEGREE**2 * math.cos(latitude)
+
+
+def strata(region, count=None):
+    """Cut a region into a grid of strata.
+
+    Args:
+        region (ee.Geometry | ee.Feature | ee.FeatureCollection | dict): The
+            region, or its GeoJSON geometry.
+        count (int, optional): Number of cells of the grid. Defaults to
+            ``config.SAMPLE_STRATA``.
+
+    Returns:
+        list: ``(geometry, area)`` pairs of the non-empty strata, with the
+            shapely geometry of the stratum and its area in square meters.
+    """
+    count = config.SAMPLE_STRATA if count is None else count
+    geometry = regions.canonical(regions.to_geojson(region))
+    side = max(1, math.isqrt(count))
+    cells = []
+    for bounds in split_bounds(list(geometry.bounds), side, side):
+        cell = shapely.intersection(geometry, box(*bounds))
+        if not cell.is_empty and cell.area > 0:
+            cells.append((cell, _area(cell)))
+    return cells
+
+
+def allocate(areas, n):
+    """Allocate points to strata in proportion to their area.
+
+    Every stratum gets at least two points, so that its variance is defined.
+
+    Args:
+        areas (list): Areas of the strata.
+        n (int): Total number of points.
+
+    Returns:
+        list: Points per stratum.
+    """
+    total = sum(areas)
+    return [max(2, round(n * area / total)) for area in areas]
+
+
+def _label(stratum):
+    return lambda feature: feature.set("stratum", stratum)
+
+
+def sample_histograms(image, band, cells, sizes, scale, seed=0):
+    """Read an image at random points of every stratum, in one request.
+
+    Args:
+        image (ee.Image): The image.
+        band (str): The band to sample.
+        cells (list): The strata, see :func:`strata`.
+        sizes (list): Points per stratum, see :func:`allocate`.
+        scale (float): The scale in meters at which the image is read.
+        seed (int, optional): Seed of the random points. Defaults to 0.
+
+    Returns:
+        list: Frequency histogram of the sampled values of every stratum,
+            with ``MASKED`` for the points where the image is masked.
+    """
+    points = ee.FeatureCollection(
+        [
+            ee.FeatureCollection.randomPoints(
+                ee.Geometry(mapping(cell), None, False), size, seed + i
+            ).map(_label(i))
+            for i, ((cell, _), size) in enumerate(zip(cells, sizes))
+        ]
+    ).flatten()
+    values = (
+        image.select([band])
+        .unmask(MASKED)
+        .reduceRegions(collection=points, reducer=ee.Reducer.first(), scale=scale)
+    )
+    groups = values.reduceColumns(
+        reducer=ee.Reducer.frequencyHistogram().group(
+            groupField=1, groupName="stratum"
+        ),
+        selectors=["first", "stratum"],
+    ).get("groups")
+    by_stratum = {
+        int(group["stratum"]): group["histogram"]
+        for group in call_with_retry(ee.List(groups).getInfo)
+    }
+    return [by_stratum.get(i, {}) for i in range(len(cells))]
+
+
+def estimate(histograms, areas, pixels, confidence=0.95):
+    """Estimate the pixel count of every value from stratified samples.
+
+    Args:
+        histograms (list): Sampled values and their counts, per stratum.
+        areas (list): Areas of the strata.
+        pixels (float): Number of pixels of the region.
+        confidence (float, optional): Confidence of the error bounds.
+            Defaults to 0.95.
+
+    Returns:
+        dict: Values, as strings, mapped to their estimated pixel count and
+            the half-width of its confidence interval.
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    total = sum(areas)
+    shares, variances = {}, {}
+    for histogram, area in zip(histograms, areas):
+        n = sum(histogram.values())
+        if not n:
+            continue
+        weight = area / total
+        for key, count in histogram.items():
+            value = int(float(key))
+            if value == MASKED:
+                continue
+            p = count / n
+            shares[value] = shares.get(value, 0) + weight * p
+            if n > 1:
+                variance = weight**2 * p * (1 - p) / (n - 1)
+                variances[value] = variances.get(value, 0) + variance
+    return {
+        str(value): (
+            shares[value] * pixels,
+            z * math.sqrt(variances.get(value, 0)) * pixels,
+        )
+        for value in shares
+    }
+
+
+def sampled_histogram(image, band, region, scale, margin=None, confidence=None, seed=0):
+    """Estimate the frequency histogram of a band within a region.
+
+    Args:
+        image (ee.Image): The image.
+        band (str): The band.
+        region (ee.Geometry | ee.Feature | ee.FeatureCollection | dict): The
+            region, or its GeoJSON geometry.
+        scale (float): The scale in meters at which the image is read.
+        margin (float, optional): See :func:`sample_size`. Defaults to
+            ``config.SAMPLE_MARGIN``.
+        confidence (float, optional): Confidence of the margin and of the
+            error bounds. Defaults to ``config.SAMPLE_CONFIDENCE``.
+        seed (int, optional): Seed of the random points. Defaults to 0.
+
+    Returns:
+        dict: Values, as strings, mapped to their estimated pixel count and
+            the half-width of its confidence interval, or None if the region
+            has fewer pixels than the sample, so that reducing it exactly is
+            cheaper.
+    """
+    margin = config.SAMPLE_MARGIN if margin is None else margin
+    confidence = config.SAMPLE_CONFIDENCE if confidence is None else confidence
+    cells = strata(region)
+    areas = [area for _, area in cells]
+    pixels = sum(areas) / scale**2
+    n = sample_size(margin, confidence)
+    if not cells or pixels <= n:
+        return None
+    sizes = allocate(areas, n)
+    histograms = sample_histograms(image, band, cells, sizes, scale, seed)
+    return estimate(histograms, areas, pixels, confidence)
@@ -0,0 +1,42 @@
+"""ASGI app serving the Solara pages together with the tile proxy and metrics.
+
+Run it with uvicorn, pointing Solara at the pages::
+
+    SOLARA_APP=./pages SURFACE_WATER_TILE_PROXY_PATH=/tiles \
+        uvicorn surface_water.server:app --port 8765
+
+Metrics are served at ``/metrics`` in the Prometheus text format. Earth
+Engine is initialized in the background as soon as the app is imported, see
+:mod:`surface_water.startup`.
+"""
+
+import solara.server.starlette as solara_server
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount, Route
+
+from . import config
+from . import metrics
+from . import startup
+from . import tile_proxy
+
+
+async def metrics_endpoint(request):
+    # Gauges read /proc and the session list, so render off the event loop.
+    text = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+metrics.install_ee_hooks()
+startup.start()
+
+routes = [Route("/metrics", endpoint=metrics_endpoint)] + list(solara_server.routes)
+if config.TILE_PROXY_PATH:
+    routes.insert(0, Mount(config.TILE_PROXY_PATH, app=tile_proxy.app))
+
+app = Starlette(
+    routes=routes,
+    lifespan=solara_server.lifespan,
+    middleware=solara_server.middleware,
+)
@@ -0,0 +1,231 @@
+"""Reclaim the resources of idle sessions.
+
+A session is a Solara kernel context, i.e. a browser tab, and holds the maps
+of the pages opened in it. Every page ``Map`` registers itself here with a
+function releasing its layers and cached data, and is forgotten when its
+widget is closed, as when the tab navigates to another page. A background
+sweep evicts sessions none of whose maps has been used for
+``config.SESSION_IDLE_TIMEOUT`` seconds, and, while the resident memory of
+the process exceeds ``config.MEMORY_BUDGET``, the sessions idle the longest
+first. Evicting a session releases the data of all of its maps, then closes
+its kernel context, which closes all of its widgets; a tab coming back to an
+evicted session is reloaded by Solara.
+
+A map is used whenever its :class:`~surface_water.executor.TaskRunner`
+starts work or is touched, by an interaction with the map itself or by a
+widget that updates the page without starting any work.
+"""
+
+import gc
+import logging
+import threading
+import time
+
+from . import config, metrics
+from .executor import _current_context, _enter
+
+logger = logging.getLogger(__name__)
+
+
+class MapSession:
+    """A registered map.
+
+    Args:
+        m (ipywidgets.Widget): The map, with its
+            :class:`~surface_water.executor.TaskRunner` in ``m.runner``,
+            whose ``last_active`` tells when the map was last used.
+        release (callable): Removes the layers and drops the cached data of
+            the map. Called without arguments, within the session.
+        footprint (callable, optional): Returns the bytes of data held by
+            the map, such as downloaded arrays. Defaults to None.
+    """
+
+    def __init__(self, m, release, footprint=None):
+        self.runner = m.runner
+        self.release = release
+        self.footprint = footprint
+
+    def idle(self):
+        """Return the seconds since the map was last used."""
+        return time.monotonic() - self.runner.last_active
+
+    def data_bytes(self):
+        """Return the bytes of data held by the map, as far as known."""
+        if self.footprint is None:
+            return 0
+        try:
+            return self.footprint()
+        except Exception:
+            return 0
+
+
+class Session:
+    """The registered maps of a Solara kernel context.
+
+    Args:
+        context (solara.server.kernel_context.VirtualKernelContext): The
+            kernel context, or None outside of Solara, where every map is a
+            session of its own.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        # MapSession by id of the map.
+        self.maps = {}
+
+    def last_active(self):
+        """Return when any map of the session was last used, see ``time.monotonic``."""
+        return max((m.runner.last_active for m in list(self.maps.values())), default=0)
+
+    def idle(self):
+        """Return the seconds since any map of the session was last used."""
+        return time.monotonic() - self.last_active()
+
+    def data_bytes(self):
+        """Return the bytes of data held by the maps, as far as known."""
+        return sum(m.data_bytes() for m in list(self.maps.values()))
+
+
+class SessionManager:
+    """The sessions of this process, swept periodically in the background.
+
+    Args:
+        idle_timeout (float, optional): Seconds after which an idle session
+            is evicted, or 0 to keep idle sessions. Defaults to
+            ``config.SESSION_IDLE_TIMEOUT``.
+        memory_budget (int, optional): Resident bytes above which sessions
+            are evicted, or 0 for no budget. Defaults to ``config.MEMORY_BUDGET``.
+        min_idle (float, optional): Seconds a session must be idle to be
+            evicted for the memory budget. Defaults to ``config.SESSION_MIN_IDLE``.
+        interval (float, optional): Seconds between sweeps. Defaults to
+            ``config.SESSION_SWEEP``.
+    """
+
+    def __init__(
+        self, idle_timeout=None, memory_budget=None, min_idle=None, interval=None
+    ):
+        self.idle_timeout = (
+            config.SESSION_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        )
+        self.memory_budget = (
+            config.MEMORY_BUDGET if memory_budget is None else memory_budget
+        )
+        self.min_idle = config.SESSION_MIN_IDLE if min_idle is None else min_idle
+        self.interval = config.SESSION_SWEEP if interval is None else interval
+        # Session by id of the kernel context, or of the map outside of Solara.
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def register(self, m, release, footprint=None):
+        """Track a map in the session of the current kernel context.
+
+        The map is forgotten when its widget is closed, and the session when
+        its kernel context closes. Interactions with the map count as use.
+        See :class:`MapSession` for the arguments.
+
+        Returns:
+            Session: The session of the map.
+        """
+        context = _current_context()
+        key = id(m) if context is None else id(context)
+        with self._lock:
+            session = self._sessions.get(key)
+            new = session is None
+            if new:
+                session = self._sessions[key] = Session(context)
+            session.maps[id(m)] = MapSession(m, release, footprint)
+            if self._sweeper is None and (self.idle_timeout or self.memory_budget):
+                self._sweeper = threading.Thread(
+                    target=self._sweep_forever, name="session-sweeper", daemon=True
+                )
+                self._sweeper.start()
+        if new and context is not None:
+            context.on_close(lambda: self._forget(session))
+
+        def closed(change):
+            # Closing a widget drops its comm.
+            if change["new"] is None:
+                self.unregister(m)
+
+        m.observe(closed, "comm")
+        m.on_interaction(lambda **kwargs: m.runner.touch())
+        return session
+
+    def unregister(self, m):
+        """Forget a map, and its session if it was the last one."""
+        with self._lock:
+            for key, session in list(self._sessions.items()):
+                if session.maps.pop(id(m), None) is not None and not session.maps:
+                    del self._sessions[key]
+
+    def _forget(self, session):
+        with self._lock:
+            for key, other in list(self._sessions.items()):
+                if other is session:
+                    del self._sessions[key]
+
+    def sessions(self):
+        """Return the tracked sessions, idle the longest first."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sorted(sessions, key=lambda s: s.last_active())
+
+    def data_bytes(self):
+        """Return the bytes of data held by all sessions, as far as known."""
+        return sum(s.data_bytes() for s in self.sessions())
+
+    def evict(self, session, reason):
+        """Release the resources of every map of a session and close its context."""
+        self._forget(session)
+        logger.info(
+            "Evicting session of %d maps idle for %.0f s holding %d bytes (%s)",
+            len(session.maps),
+            session.idle(),
+            session.data_bytes(),
+            reason,
+        )
+        metrics.SESSIONS_EVICTED.inc(reason=reason)
+        for m in list(session.maps.values()):
+            m.runner.cancel()
+            try:
+                with _enter(session.context):
+                    m.release()
+            except Exception as e:
+                logger.warning("Releasing a map failed: %s", e)
+        if session.context is not None and not session.context.closed_event.is_set():
+            session.context.close(reason="evicted")
+
+    def sweep(self):
+        """Evict idle sessions, then sessions over the memory budget."""
+        if self.idle_timeout:
+            for session in self.sessions():
+                if session.idle() >= self.idle_timeout:
+                    self.evict(session, "idle")
+        if self.memory_budget:
+            for session in self.sessions():
+                if metrics.rss() <= self.memory_budget:
+                    break
+                if session.idle() < self.min_idle:
+                    break
+                self.evict(session, "memory")
+                gc.collect()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Sweeping sessions failed: %s", e)
+
+
+sessions = SessionManager()
+
+
+def register(m, release, footprint=None):
+    """Track a map with the process-wide manager.
+
+    See :meth:`SessionManager.register` for the arguments.
+    """
+    return sessions.register(m, release, footprint)
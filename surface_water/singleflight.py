@@ -0,0 +1,65 @@
+"""Process-wide deduplication of identical, concurrent computations.
+
+When several sessions ask for the same result at the same time, e.g. for a
+lake whose link is being shared, only the first request runs and the others
+wait for its result instead of sending the same Earth Engine request again.
+"""
+
+import threading
+from concurrent.futures import Future
+
+from .executor import Cancelled
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run ``fn``, or wait for the run of ``fn`` already in flight for ``key``.
+
+        If the run in flight is cancelled by its own caller, the callers that
+        were waiting for it start a new run instead of failing.
+
+        Args:
+            key (hashable): Identifies the computation.
+            fn (callable): Computes the result. Called without arguments.
+
+        Returns:
+            object: The result of ``fn``.
+        """
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = self._calls[key] = Future()
+            if leader:
+                break
+            try:
+                return future.result()
+            except Cancelled:
+                continue
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        """Return the number of computations in flight."""
+        with self._lock:
+            return len(self._calls)
+
+
+flights = SingleFlight()
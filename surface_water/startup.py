@@ -0,0 +1,144 @@
+"""Start the server quickly and get Earth Engine ready in the background.
+
+Solara imports every page when the first browser connects, and geemap
+authenticates and initializes Earth Engine when the first map is created, so
+the first visitor used to wait for both. Pages now only import their module
+of :mod:`surface_water.pages` when they are shown, see :func:`lazy_page`, and
+:func:`start` imports geemap and the pages, initializes Earth Engine and
+requests the map ids of static layers in a background thread when the server
+starts. The seconds spent in every phase are logged and exported as
+``surface_water_startup_seconds``.
+"""
+
+import contextlib
+import importlib
+import logging
+import os
+import threading
+import time
+
+import solara
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Modules of surface_water.pages, warmed up in this order.
+PAGES = ("jrc", "compare", "timeseries", "timelapse")
+
+_lock = threading.Lock()
+_thread = None
+
+
+def process_age():
+    """Return the seconds since this process started, or None if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The start time is the 22nd field, counted after the command name.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def lazy_page(module):
+    """Return a page component that imports its module when first shown.
+
+    The module is imported in a thread while a progress bar is shown, then
+    its ``Page`` component is rendered. Calling this also starts the warm-up,
+    see :func:`start`.
+
+    Args:
+        module (str): Name of the module defining ``Page``, e.g.
+            ``"surface_water.pages.jrc"``.
+
+    Returns:
+        solara.Component: The page component.
+    """
+    start()
+
+    @solara.component
+    def Page():
+        result = solara.use_thread(
+            lambda: importlib.import_module(module), dependencies=[]
+        )
+        if result.state == solara.ResultState.FINISHED:
+            result.value.Page()
+        elif result.state == solara.ResultState.ERROR:
+            solara.Error(f"Loading the page failed: {result.error}")
+        else:
+            solara.ProgressLinear(True)
+
+    return Page
+
+
+@contextlib.contextmanager
+def _phase(phases, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - start
+        metrics.STARTUP_SECONDS.set(phases[name], phase=name)
+
+
+def warm(pages=PAGES):
+    """Import the pages, initialize Earth Engine and fetch static map ids.
+
+    Args:
+        pages (tuple, optional): Modules of :mod:`surface_water.pages` to
+            import. Defaults to ``PAGES``.
+
+    Returns:
+        dict: Seconds spent in every phase, including the ``server`` start
+            before the warm-up, if known.
+    """
+    phases = {}
+    age = process_age()
+    if age is not None:
+        phases["server"] = age
+        metrics.STARTUP_SECONDS.set(age, phase="server")
+    with _phase(phases, "geemap"):
+        import geemap
+    try:
+        with _phase(phases, "earth_engine"):
+            geemap.ee_initialize()
+        with _phase(phases, "map_ids"):
+            from . import jrc
+            from .map_ids import map_ids
+
+            # Fetched even when the tiles are rendered locally, as a first
+            # request that also warms up the connection to Earth Engine.
+            map_ids.tile_url(jrc.occurrence_image, jrc.OCCURRENCE_VIS)
+    except Exception as e:
+        # The first map will try again.
+        logger.warning("Initializing Earth Engine failed: %s", e)
+    with _phase(phases, "pages"):
+        for page in pages:
+            importlib.import_module(f"surface_water.pages.{page}")
+    total = sum(phases.values())
+    metrics.STARTUP_SECONDS.set(total, phase="total")
+    logger.info(
+        "Ready %.1f s after start: %s",
+        total,
+        ", ".join(f"{name} {seconds:.1f} s" for name, seconds in phases.items()),
+    )
+    return phases
+
+
+def _warm():
+    try:
+        warm()
+    except Exception as e:
+        logger.warning("Warming up failed: %s", e)
+
+
+def start():
+    """Run :func:`warm` in a background thread, once per process."""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_warm, name="warm-up", daemon=True)
+            _thread.start()
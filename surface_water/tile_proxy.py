@@ -0,0 +1,325 @@
+"""A caching proxy for Earth Engine tile layers.
+
+Layers are registered under a fingerprint of what they show (image and
+visualization), together with a function returning their current upstream
+URL template, and the map loads their tiles from
+``{TILE_PROXY_PATH}/{fingerprint}/{z}/{x}/{y}``. A tile is fetched from Earth
+Engine once, stored in a size-bounded disk cache with least recently used
+eviction, and served from disk afterwards with long-lived cache headers.
+Only the most recently used layers are kept registered, see
+``config.TILE_PROXY_LAYERS``. Layers can also be registered with a function
+rendering their tiles locally, which then replaces Earth Engine entirely.
+
+The proxy is an ASGI app, mounted next to the Solara pages by
+:mod:`surface_water.server`.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import requests
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route
+
+from . import config, metrics
+from .cache import make_key
+from .singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = "public, max-age=86400"
+
+# Fingerprints are the first 32 hex digits of a key from make_key.
+_FINGERPRINT = re.compile("[0-9a-f]{32}")
+
+
+class TileStore:
+    """Tiles on disk, evicting the least recently used beyond a size limit.
+
+    Args:
+        directory (str): The directory of the tiles.
+        max_bytes (int): The size limit of all tiles.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._sizes = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._indexed = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        # The tiles of previous runs are indexed in the background, so that
+        # the first request does not wait for a walk of the whole cache.
+        threading.Thread(
+            target=self._index, name="surface-water-tile-index", daemon=True
+        ).start()
+
+    def _index(self):
+        tiles = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                # Tiles being written, or whose write never completed.
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                tiles.append((stat.st_mtime, path, stat.st_size))
+        with self._lock:
+            # Oldest first, and before the tiles used since the start.
+            sizes = OrderedDict()
+            for _, path, size in sorted(tiles):
+                if path not in self._sizes:
+                    sizes[path] = size
+                    self._bytes += size
+            sizes.update(self._sizes)
+            self._sizes = sizes
+            evicted = self._evict()
+        self._remove(evicted)
+        self._indexed.set()
+
+    def wait(self, timeout=None):
+        """Wait until the tiles of previous runs are indexed.
+
+        Returns:
+            bool: True if they are, False if the timeout expired first.
+        """
+        return self._indexed.wait(timeout)
+
+    def _path(self, fingerprint, z, x, y):
+        return os.path.join(self.directory, fingerprint, str(z), str(x), str(y))
+
+    def get(self, fingerprint, z, x, y):
+        """Return the content of a tile, or None if it is not stored."""
+        path = self._path(fingerprint, z, x, y)
+        with self._lock:
+            known = path in self._sizes
+            if known:
+                self._sizes.move_to_end(path)
+        # Until the index is complete, tiles of previous runs are looked up
+        # on disk.
+        if not known and self._indexed.is_set():
+            return None
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            # The modification time records recency across restarts.
+            os.utime(path)
+        except OSError:
+            if known:
+                self._forget(path)
+            return None
+        if not known:
+            with self._lock:
+                if path not in self._sizes:
+                    self._sizes[path] = len(content)
+                    self._bytes += len(content)
+        return content
+
+    def put(self, fingerprint, z, x, y, content):
+        """Store the content of a tile, evicting old tiles if needed."""
+        path = self._path(fingerprint, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(content) - self._sizes.pop(path, 0)
+            self._sizes[path] = len(content)
+            evicted = self._evict()
+        self._remove(evicted)
+
+    def _evict(self):
+        # Called with the lock held.
+        evicted = []
+        while self._bytes > self.max_bytes and len(self._sizes) > 1:
+            old_path, size = self._sizes.popitem(last=False)
+            self._bytes -= size
+            evicted.append(old_path)
+        return evicted
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _forget(self, path):
+        with self._lock:
+            self._bytes -= self._sizes.pop(path, 0)
+
+    def size(self):
+        """Return the number of bytes stored."""
+        with self._lock:
+            return self._bytes
+
+
+# Upstream URL template of every registered layer, by fingerprint, and local
+# renderer of every layer registered with one. Both are bounded to
+# config.TILE_PROXY_LAYERS, forgetting the least recently used layers.
+_layers = OrderedDict()
+_renderers = OrderedDict()
+_layers_lock = threading.Lock()
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide tile store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TileStore(config.TILE_CACHE_DIR, config.TILE_CACHE_BYTES)
+        return _store
+
+
+def enabled():
+    """Return True if layers should load their tiles through the proxy."""
+    return bool(config.TILE_PROXY_PATH)
+
+
+def register(fingerprint, upstream):
+    """Register a layer with the proxy.
+
+    Args:
+        fingerprint (str): Identifies what the layer shows. Tiles are cached
+            under it, so it must change whenever the tiles would.
+        upstream (callable): Returns the current upstream URL template, with
+            ``{z}``, ``{x}`` and ``{y}`` placeholders.
+
+    Returns:
+        str: The URL template of the layer on the proxy.
+    """
+    _remember(_layers, fingerprint, upstream)
+    return f"{config.TILE_PROXY_PATH}/{fingerprint}/{{z}}/{{x}}/{{y}}"
+
+
+def register_renderer(fingerprint, render):
+    """Register a layer whose tiles are rendered locally.
+
+    Args:
+        fingerprint (str): Identifies what the layer shows, see :func:`register`.
+        render (callable): Takes ``z``, ``x`` and ``y`` and returns the PNG tile.
+
+    Returns:
+        str: The URL template of the layer on the proxy.
+    """
+    _remember(_renderers, fingerprint, render)
+    return f"{config.TILE_PROXY_PATH}/{fingerprint}/{{z}}/{{x}}/{{y}}"
+
+
+def _remember(layers, fingerprint, value):
+    with _layers_lock:
+        layers[fingerprint] = value
+        layers.move_to_end(fingerprint)
+        while len(layers) > config.TILE_PROXY_LAYERS:
+            layers.popitem(last=False)
+
+
+def _lookup(layers, fingerprint):
+    with _layers_lock:
+        value = layers.get(fingerprint)
+        if value is not None:
+            layers.move_to_end(fingerprint)
+        return value
+
+
+def proxy_url(url, ee_object, vis_params):
+    """Route the tile URL of an Earth Engine layer through the proxy.
+
+    Args:
+        url (str): The upstream URL template of the layer.
+        ee_object (ee.ComputedObject): The object shown by the layer.
+        vis_params (dict): Its visualization parameters.
+
+    Returns:
+        str: The URL template to use in the map, which is ``url`` itself when
+            the proxy is not enabled.
+    """
+    if not enabled():
+        return url
+    fingerprint = make_key("tiles", ee_object.serialize(), vis_params)[:32]
+    return register(fingerprint, lambda: url)
+
+
+def proxy_layer(layer, ee_object, vis_params):
+    """Make an existing Earth Engine tile layer load through the proxy.
+
+    Args:
+        layer (ipyleaflet.TileLayer): The layer, e.g. from ``geemap.ee_tile_layer``.
+        ee_object (ee.ComputedObject): The object shown by the layer.
+        vis_params (dict): Its visualization parameters.
+
+    Returns:
+        ipyleaflet.TileLayer: The layer.
+    """
+    if layer is not None:
+        layer.url = proxy_url(layer.url, ee_object, vis_params)
+    return layer
+
+
+def fetch_tile(fingerprint, z, x, y):
+    """Return a tile from the disk cache, fetching or rendering it if needed.
+
+    Args:
+        fingerprint (str): The fingerprint of the layer.
+        z (int): The zoom level.
+        x (int): The column.
+        y (int): The row.
+
+    Returns:
+        bytes: The tile, or None if the layer is unknown or has no such tile.
+    """
+    store = get_store()
+    content = store.get(fingerprint, z, x, y)
+    if content is not None:
+        metrics.CACHE_REQUESTS.inc(cache="tiles", result="hit")
+        return content
+    render = _lookup(_renderers, fingerprint)
+    upstream = _lookup(_layers, fingerprint)
+    if render is None and upstream is None:
+        return None
+    metrics.CACHE_REQUESTS.inc(cache="tiles", result="miss")
+
+    def fetch():
+        if render is not None:
+            content = render(z, x, y)
+            store.put(fingerprint, z, x, y, content)
+            return content
+        url = upstream().format(z=z, x=x, y=y)
+        response = requests.get(url, timeout=60)
+        if response.status_code != 200:
+            logger.warning("Tile %s returned %s", url, response.status_code)
+            return None
+        store.put(fingerprint, z, x, y, response.content)
+        return response.content
+
+    return flights.do(("tile", fingerprint, z, x, y), fetch)
+
+
+async def tile(request):
+    params = request.path_params
+    # The fingerprint is a directory of the store, so nothing else may reach it.
+    if not _FINGERPRINT.fullmatch(params["fingerprint"]):
+        return Response(status_code=404)
+    content = await run_in_threadpool(
+        fetch_tile, params["fingerprint"], params["z"], params["x"], params["y"]
+    )
+    if content is None:
+        return Response(status_code=404)
+    return Response(
+        content, media_type="image/png", headers={"Cache-Control": CACHE_CONTROL}
+    )
+
+
+app = Starlette(routes=[Route("/{fingerprint}/{z:int}/{x:int}/{y:int}", endpoint=tile)])
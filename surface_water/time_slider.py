@@ -0,0 +1,240 @@
+"""A time slider that loads the frames of a time series on demand.
+
+``geemap.Map.add_time_slider`` requests a map id for the whole stack of
+frames up front. This slider only requests the map id of the frame on
+display, prefetches the frames around it in the background and forgets the
+least recently used ones, so opening it costs the same for 10 or 500 frames.
+All frames are shown through a single tile layer whose URL is swapped.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import ee
+import ipyleaflet
+import ipywidgets as widgets
+
+from . import config
+from .executor import TaskRunner, get_pool
+from .tile_proxy import proxy_url
+
+
+class FrameCache:
+    """Tile URLs of the frames of an image collection, fetched on demand.
+
+    Args:
+        collection (ee.ImageCollection): The frames.
+        size (int): Number of frames in the collection.
+        vis_params (dict): Visualization parameters of the frames.
+        maxsize (int, optional): Number of URLs kept. Defaults to
+            ``config.SLIDER_CACHE``.
+    """
+
+    def __init__(self, collection, size, vis_params, maxsize=None):
+        self.frames = collection.toList(size)
+        self.size = size
+        self.vis_params = vis_params
+        self.maxsize = config.SLIDER_CACHE if maxsize is None else maxsize
+        self._urls = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def cached(self, index):
+        """Return the URL of a frame if it is already known, else None."""
+        with self._lock:
+            url = self._urls.get(index)
+            if url is not None:
+                self._urls.move_to_end(index)
+            return url
+
+    def url(self, index):
+        """Return the URL of a frame, fetching its map id if needed.
+
+        Args:
+            index (int): The index of the frame.
+
+        Returns:
+            str: The tile URL template of the frame.
+        """
+        url = self.cached(index)
+        if url is not None:
+            return url
+        # A prefetch of the frame may be queued behind other work on the
+        # shared pool, so fetch it here rather than wait for it.
+        return self._fetch(index)
+
+    def prefetch(self, indices):
+        """Fetch the map ids of frames in the background.
+
+        Args:
+            indices (iterable): Indices of the frames. Out of range indices and
+                frames already known or being fetched are skipped.
+        """
+        with self._lock:
+            for index in indices:
+                if 0 <= index < self.size and index not in self._urls:
+                    if index not in self._pending:
+                        self._pending[index] = get_pool().submit(self._fetch, index)
+
+    def _fetch(self, index):
+        try:
+            image = ee.Image(self.frames.get(index))
+            url = image.getMapId(self.vis_params)["tile_fetcher"].url_format
+            url = proxy_url(url, image, self.vis_params)
+        except Exception:
+            with self._lock:
+                self._pending.pop(index, None)
+            raise
+        with self._lock:
+            self._pending.pop(index, None)
+            self._urls[index] = url
+            self._urls.move_to_end(index)
+            while len(self._urls) > self.maxsize:
+                self._urls.popitem(last=False)
+        return url
+
+
+def add_time_slider(
+    m,
+    collection,
+    labels,
+    vis_params={},
+    region=None,
+    layer_name="Image X",
+    time_interval=1,
+    position="bottomright",
+    slider_length="150px",
+    opacity=1.0,
+    window=None,
+):
+    """Add a time slider that loads frames on demand to a map.
+
+    The control is stored in ``m.slider_ctrl``, like the one of
+    ``geemap.Map.add_time_slider``.
+
+    Args:
+        m (geemap.Map): The map.
+        collection (ee.ImageCollection): The frames.
+        labels (list): The label of every frame.
+        vis_params (dict, optional): Visualization parameters. Defaults to {}.
+        region (ee.Geometry, optional): Clips the frames. Defaults to None.
+        layer_name (str, optional): Name of the frame layer. Defaults to "Image X".
+        time_interval (int, optional): Seconds per frame when playing. Defaults to 1.
+        position (str, optional): Position of the control. Defaults to "bottomright".
+        slider_length (str, optional): Length of the slider. Defaults to "150px".
+        opacity (float, optional): Opacity of the frame layer. Defaults to 1.0.
+        window (int, optional): Frames prefetched on each side of the current
+            one. Defaults to ``config.SLIDER_WINDOW``.
+    """
+    window = config.SLIDER_WINDOW if window is None else window
+    if region is not None:
+        collection = collection.map(lambda img: img.clip(region))
+    frames = FrameCache(collection, len(labels), vis_params)
+    # Frames load on the runner of the map, if it has one, so that they count
+    # as use of its session and are cancelled with its other work.
+    runner = getattr(m, "runner", None) or TaskRunner("time_slider")
+
+    layer = ipyleaflet.TileLayer(
+        url=frames.url(0),
+        name=layer_name,
+        attribution="Google Earth Engine",
+        opacity=opacity,
+        max_zoom=24,
+    )
+    old_layer = m.find_layer(layer_name)
+    if old_layer is not None:
+        m.remove(old_layer)
+    m.add(layer)
+    frames.prefetch(range(1, window + 1))
+
+    slider = widgets.IntSlider(
+        min=1,
+        max=len(labels),
+        readout=False,
+        continuous_update=False,
+        layout=widgets.Layout(width=slider_length),
+    )
+    label = widgets.Label(
+        value=labels[0], layout=widgets.Layout(padding="0px 5px 0px 5px")
+    )
+    play_btn = widgets.Button(
+        icon="play",
+        tooltip="Play the time slider",
+        button_style="primary",
+        layout=widgets.Layout(width="32px"),
+    )
+    pause_btn = widgets.Button(
+        icon="pause",
+        tooltip="Pause the time slider",
+        button_style="primary",
+        layout=widgets.Layout(width="32px"),
+    )
+    close_btn = widgets.Button(
+        icon="times",
+        tooltip="Close the time slider",
+        button_style="primary",
+        layout=widgets.Layout(width="32px"),
+    )
+    playing = threading.Event()
+
+    def show(index, url):
+        if slider.value - 1 == index:
+            layer.url = url
+        m.default_style = {"cursor": "default"}
+
+    def slider_changed(change):
+        index = slider.value - 1
+        label.value = labels[index]
+        frames.prefetch(range(index - window, index + window + 1))
+        url = frames.cached(index)
+        if url is not None:
+            runner.cancel("frame")
+            runner.touch()
+            show(index, url)
+        else:
+            m.default_style = {"cursor": "wait"}
+            runner.submit(
+                "frame",
+                lambda task: frames.url(index),
+                on_done=lambda url: show(index, url),
+            )
+
+    slider.observe(slider_changed, "value")
+
+    def play():
+        # Stops when paused, or when the control was removed from the map.
+        while playing.is_set() and slider_ctrl in m.controls:
+            index = slider.value % len(labels)
+            # Wait for the next frame so that playback never skips frames.
+            frames.url(index)
+            if not playing.is_set():
+                break
+            slider.value = index + 1
+            time.sleep(time_interval)
+
+    def play_click(b):
+        if not playing.is_set():
+            playing.set()
+            threading.Thread(target=play, daemon=True).start()
+
+    def pause_click(b):
+        playing.clear()
+
+    def close_click(b):
+        playing.clear()
+        runner.cancel("frame")
+        if layer in m.layers:
+            m.remove(layer)
+        if slider_ctrl in m.controls:
+            m.remove(slider_ctrl)
+        slider_widget.close()
+
+    play_btn.on_click(play_click)
+    pause_btn.on_click(pause_click)
+    close_btn.on_click(close_click)
+
+    slider_widget = widgets.HBox([slider, label, play_btn, pause_btn, close_btn])
+    slider_ctrl = ipyleaflet.WidgetControl(widget=slider_widget, position=position)
+    m.add(slider_ctrl)
+    m.slider_ctrl = slider_ctrl
@@ -0,0 +1,120 @@
+"""Memoized Landsat time series for the time slider and split map views.
+
+A :class:`TimeSeries` holds the collection built by
+``geemap.landsat_timeseries`` together with any metadata resolved from it,
+so switching between views or band combinations reuses both. Each session
+keeps its recent series in a :class:`TimeSeriesMemo`. Resolved date lists are
+also shared by all sessions in the process; they are kept in memory only,
+because the Landsat archive keeps growing.
+"""
+
+import threading
+from collections import OrderedDict
+
+import geemap
+
+from .cache import ResultCache, canonical_roi, make_key
+
+DATE_FORMATS = {"year": "YYYY", "quarter": "YYYY-MM", "month": "YYYY-MM"}
+
+_dates_cache = ResultCache("landsat_dates", directory="")
+
+
+def _series_key(roi, start_year, end_year, start_month, end_month, frequency):
+    return make_key(
+        "landsat_timeseries",
+        canonical_roi(roi),
+        start_year,
+        end_year,
+        start_month,
+        end_month,
+        frequency,
+    )
+
+
+class TimeSeries:
+    """A Landsat time series of a region and its resolved metadata.
+
+    Args:
+        roi (ee.Geometry | ee.FeatureCollection): The region of interest.
+        start_year (int): The first year.
+        end_year (int): The last year.
+        start_month (int): The first month of each year.
+        end_month (int): The month each year ends with.
+        frequency (str): One of ``year``, ``quarter`` or ``month``.
+    """
+
+    def __init__(self, roi, start_year, end_year, start_month, end_month, frequency):
+        self.roi = roi
+        self.frequency = frequency
+        self.date_format = DATE_FORMATS[frequency]
+        self.key = _series_key(
+            roi, start_year, end_year, start_month, end_month, frequency
+        )
+        self.collection = geemap.landsat_timeseries(
+            roi=roi,
+            start_year=start_year,
+            end_year=end_year,
+            start_date=str(start_month).zfill(2) + "-01",
+            end_date=str(end_month).zfill(2) + "-01",
+            frequency=frequency,
+        )
+        self._dates = None
+        self._lock = threading.Lock()
+
+    def dates(self):
+        """Return the formatted date of every image in the collection.
+
+        Returns:
+            list: The dates, fetched from Earth Engine at most once.
+        """
+        with self._lock:
+            if self._dates is None:
+                key = make_key(self.key, "dates", self.date_format)
+                self._dates = _dates_cache.get_or_compute(
+                    key,
+                    lambda: geemap.image_dates(
+                        self.collection, self.date_format
+                    ).getInfo(),
+                )
+            return self._dates
+
+
+class TimeSeriesMemo:
+    """The most recently used time series of a session.
+
+    Args:
+        maxsize (int, optional): Number of series kept. Defaults to 4.
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, roi, start_year, end_year, start_month, end_month, frequency):
+        """Return the time series for the given arguments, building it if needed.
+
+        Args:
+            See :class:`TimeSeries`.
+
+        Returns:
+            TimeSeries: The memoized time series.
+        """
+        key = _series_key(roi, start_year, end_year, start_month, end_month, frequency)
+        with self._lock:
+            if key in self._series:
+                self._series.move_to_end(key)
+                return self._series[key]
+            series = TimeSeries(
+                roi, start_year, end_year, start_month, end_month, frequency
+            )
+            self._series[key] = series
+            while len(self._series) > self.maxsize:
+                self._series.popitem(last=False)
+            return series
+
+    def clear(self):
+        """Forget every time series."""
+        with self._lock:
+            self._series.clear()
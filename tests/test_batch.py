@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from surface_water import batch
+
+SQUARE = {
+    "type": "Polygon",
+    "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]],
+}
+
+
+def area_job(calls, fail=()):
+    def job(geometry, options):
+        roi = geometry["roi"]
+        calls.append(roi)
+        if roi in fail:
+            raise RuntimeError(f"{roi} failed")
+        return pd.DataFrame({"key": [1, 2], "value": [options.scale, 2.0]})
+
+    return job
+
+
+def rois(*names):
+    # Geometries are tagged with their region, to tell the calls apart.
+    return [(name, dict(SQUARE, roi=name)) for name in names]
+
+
+def parts(output):
+    return [
+        name
+        for _, _, files in os.walk(f"{output}.parts")
+        for name in files
+        if name.endswith(".parquet")
+    ]
+
+
+def test_results_are_checkpointed_and_combined(tmp_path):
+    output = str(tmp_path / "out.parquet")
+    calls = []
+    options = argparse.Namespace(scale=30)
+
+    summary = batch.run_batch(
+        rois("a", "b", "c"), "area", output, options, jobs={"area": area_job(calls)}
+    )
+
+    assert summary == {"computed": 3, "resumed": 0, "failed": 0}
+    assert sorted(calls) == ["a", "b", "c"]
+    assert len(parts(output)) == 3
+    df = pd.read_parquet(output)
+    assert list(df.columns) == ["roi", "key", "value"]
+    assert list(df["roi"]) == ["a", "a", "b", "b", "c", "c"]
+    assert set(df["value"]) == {30, 2.0}
+
+
+def test_failed_regions_are_retried_on_the_next_run(tmp_path):
+    output = str(tmp_path / "out.parquet")
+    options = argparse.Namespace(scale=30)
+    calls = []
+
+    summary = batch.run_batch(
+        rois("a", "b", "c"),
+        "area",
+        output,
+        options,
+        jobs={"area": area_job(calls, fail={"b"})},
+    )
+
+    assert summary == {"computed": 2, "resumed": 0, "failed": 1}
+    assert list(pd.read_parquet(output)["roi"].unique()) == ["a", "c"]
+
+    calls = []
+    summary = batch.run_batch(
+        rois("a", "b", "c"), "area", output, options, jobs={"area": area_job(calls)}
+    )
+
+    assert summary == {"computed": 1, "resumed": 2, "failed": 0}
+    assert calls == ["b"]
+    assert list(pd.read_parquet(output)["roi"].unique()) == ["a", "b", "c"]
+
+
+def test_checkpoints_depend_on_the_options(tmp_path):
+    output = str(tmp_path / "out.parquet")
+    calls = []
+    jobs = {"area": area_job(calls)}
+
+    batch.run_batch(rois("a"), "area", output, argparse.Namespace(scale=30), jobs=jobs)
+    batch.run_batch(rois("a"), "area", output, argparse.Namespace(scale=90), jobs=jobs)
+
+    assert calls == ["a", "a"]
+    assert len(parts(output)) == 2
+    assert list(pd.read_parquet(output)["value"]) == [90, 2.0]
+
+
+def write_rois(path, names):
+    features = [
+        {"type": "Feature", "properties": {"name": name}, "geometry": SQUARE}
+        for name in names
+    ]
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+def test_read_rois(tmp_path):
+    path = str(tmp_path / "rois.geojson")
+    write_rois(path, ["x", "y"])
+
+    assert [roi_id for roi_id, _ in batch.read_rois(path, "name")] == ["x", "y"]
+    assert [roi_id for roi_id, _ in batch.read_rois(path)] == ["0", "1"]
+
+
+def test_read_rois_rejects_duplicate_ids(tmp_path):
+    path = str(tmp_path / "rois.geojson")
+    write_rois(path, ["x", "y", "x"])
+
+    with pytest.raises(ValueError, match="x"):
+        batch.read_rois(path, "name")
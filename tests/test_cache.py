@@ -0,0 +1,14 @@
+from surface_water import cache, config
+
+
+def test_isolate_empties_caches_and_keeps_the_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    results = cache.ResultCache("results")
+    results.set("key", 1)
+
+    cache.isolate()
+
+    assert config.CACHE_DIR == ""
+    assert results.get("key") is None
+    assert cache.ResultCache("other")._path is None
+    assert cache.ResultCache("results", directory=str(tmp_path)).get("key") == 1
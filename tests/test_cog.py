@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from surface_water import cog
+
+rasterio = pytest.importorskip("rasterio")
+
+NODATA = 255
+
+
+@pytest.fixture
+def occurrence(tmp_path):
+    """A 4x4 occurrence COG of 0.25 degree pixels over (0, 0)-(1, 1)."""
+    data = np.array(
+        [
+            [0, 1, 1, 100],
+            [50, 50, 50, NODATA],
+            [0, 0, 101, 100],
+            [NODATA, 7, 7, 7],
+        ],
+        dtype=np.uint8,
+    )
+    path = str(tmp_path / "occurrence.tif")
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=4,
+        height=4,
+        count=1,
+        dtype="uint8",
+        crs="EPSG:4326",
+        transform=rasterio.transform.from_origin(0, 1, 0.25, 0.25),
+        nodata=NODATA,
+    ) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def box(west, south, east, north):
+    return {
+        "type": "Polygon",
+        "coordinates": [
+            [[west, south], [east, south], [east, north], [west, north], [west, south]]
+        ],
+    }
+
+
+def test_histogram_has_the_bins_of_earth_engine(occurrence):
+    # 0.25 degrees at the equator, so the COG is read at its native resolution.
+    scale = 0.25 * cog.METERS_PER_DEGREE
+
+    histogram = cog.occurrence_histogram(occurrence, box(0, 0, 1, 1), scale)
+
+    # Like the masked occurrence band: no 0, no data or out of range values.
+    assert histogram == {"1": 2, "7": 3, "50": 3, "100": 2}
+
+
+def test_histogram_counts_pixels_within_the_polygon(occurrence):
+    scale = 0.25 * cog.METERS_PER_DEGREE
+
+    histogram = cog.occurrence_histogram(occurrence, box(0, 0.5, 0.5, 1), scale)
+
+    assert histogram == {"1": 1, "50": 2}
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from surface_water import cube
+
+xr = pytest.importorskip("xarray")
+pytest.importorskip("dask")
+pytest.importorskip("rasterio")
+
+
+def box(west, south, east, north):
+    return {
+        "type": "Polygon",
+        "coordinates": [
+            [[west, south], [east, south], [east, north], [west, north], [west, south]]
+        ],
+    }
+
+
+@pytest.fixture
+def water_cube(tmp_path):
+    """Three months of 1/8 degree pixels over (0, 0)-(1, 1), north to south.
+
+    The first month is all water, the second has none, the third has water
+    in the western half only.
+    """
+    x = np.arange(8) * 0.125 + 0.0625
+    y = np.arange(8)[::-1] * 0.125 + 0.0625
+    water = np.full((3, 8, 8), 1, dtype=np.uint8)
+    water[0] = cube.WATER
+    water[2, :, :4] = cube.WATER
+    water[1, 0, 0] = 0
+    data = xr.Dataset(
+        {"water": (("time", "y", "x"), water)},
+        coords={
+            "time": pd.to_datetime(["2000-01-01", "2000-02-01", "2000-03-01"]),
+            "y": y,
+            "x": x,
+        },
+    )
+    path = str(tmp_path / "cube.nc")
+    data.to_netcdf(path)
+    return path
+
+
+def spherical_area(west, south, east, north):
+    # Hectares of a box on the sphere of the cube.
+    return (
+        cube._EARTH_RADIUS**2
+        * math.radians(east - west)
+        * (math.sin(math.radians(north)) - math.sin(math.radians(south)))
+        / 1e4
+    )
+
+
+def test_monthly_history_sums_water_areas(water_cube):
+    df = cube.monthly_history(water_cube, box(0, 0, 1, 1), 30)
+
+    assert list(df["Month"]) == ["2000_01", "2000_02", "2000_03"]
+    assert list(df["month"]) == ["01", "02", "03"]
+    area = spherical_area(0, 0, 1, 1)
+    assert df["Area"].iloc[0] == pytest.approx(area)
+    assert df["Area"].iloc[1] == 0
+    assert df["Area"].iloc[2] == pytest.approx(spherical_area(0, 0, 0.5, 1))
+
+
+def test_monthly_history_counts_pixels_within_the_polygon(water_cube):
+    df = cube.monthly_history(water_cube, box(0.25, 0.25, 0.75, 0.625), 30)
+
+    assert df["Area"].iloc[0] == pytest.approx(spherical_area(0.25, 0.25, 0.75, 0.625))
+    assert df["Area"].iloc[2] == pytest.approx(spherical_area(0.25, 0.25, 0.5, 0.625))
+
+
+def test_coarse_scales_sample_the_grid(water_cube):
+    # Every other pixel, each standing for four.
+    scale = 0.25 * cube.METERS_PER_DEGREE
+
+    df = cube.monthly_history(water_cube, box(0, 0, 1, 1), scale)
+
+    assert df["Area"].iloc[0] == pytest.approx(spherical_area(0, 0, 1, 1), rel=1e-3)
+
+
+def test_regions_outside_of_the_cube_are_not_computed(water_cube):
+    assert cube.monthly_history(water_cube, box(0.5, 0.5, 1.5, 1), 30) is None
@@ -0,0 +1,152 @@
+import threading
+
+from surface_water import executor
+from surface_water.executor import TaskRunner
+
+
+class ClosedContext:
+    def __init__(self):
+        self.closed_event = threading.Event()
+        self.closed_event.set()
+
+
+def test_submit_calls_on_done():
+    runner = TaskRunner("test")
+    results = []
+    runner.submit("work", lambda task: 42, on_done=results.append)
+    assert runner.wait(5)
+    assert results == [42]
+    assert not runner.running("work")
+
+
+def test_submit_supersedes_task_under_same_key():
+    runner = TaskRunner("test")
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow(task):
+        started.set()
+        release.wait(5)
+        return "first"
+
+    first = runner.submit("work", slow, on_done=results.append)
+    started.wait(5)
+    runner.submit("work", lambda task: "second", on_done=results.append)
+    assert first.cancelled()
+    release.set()
+    assert runner.wait(5)
+    assert results == ["second"]
+
+
+def test_cancel_drops_result():
+    runner = TaskRunner("test")
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow(task):
+        started.set()
+        release.wait(5)
+        return "done"
+
+    task = runner.submit("work", slow, on_done=results.append)
+    started.wait(5)
+    runner.cancel()
+    assert task.cancelled()
+    assert not runner.running("work")
+    release.set()
+    task.future.result(5)
+    assert results == []
+
+
+def test_layers_of_superseded_or_cancelled_tasks_are_not_shown():
+    # As on the pages: tasks build the layers, on_done adds them to the map.
+    runner = TaskRunner("test")
+    layers = []
+    started, release = threading.Event(), threading.Event()
+
+    def apply(name, block=False):
+        def compute(task):
+            if block:
+                started.set()
+                release.wait(5)
+            return [f"{name} image", f"{name} water"]
+
+        started.clear()
+        return runner.submit("compare", compute, on_done=layers.extend)
+
+    # Apply, then Apply again.
+    first = apply("first", block=True)
+    started.wait(5)
+    apply("second")
+    release.set()
+    first.future.result(5)
+    assert runner.wait(5)
+    assert layers == ["second image", "second water"]
+
+    # Apply, then Reset.
+    layers.clear()
+    release.clear()
+    third = apply("third", block=True)
+    started.wait(5)
+    runner.cancel()
+    release.set()
+    third.future.result(5)
+    assert runner.wait(5)
+    assert layers == []
+
+
+def test_on_error_receives_exception():
+    runner = TaskRunner("test")
+    errors = []
+
+    def fail(task):
+        raise ValueError("boom")
+
+    runner.submit("work", fail, on_error=errors.append)
+    assert runner.wait(5)
+    assert [str(e) for e in errors] == ["boom"]
+
+
+def test_progress_is_emitted():
+    runner = TaskRunner("test")
+    progress = []
+
+    def work(task):
+        task.emit(1)
+        task.emit(2)
+        return 3
+
+    runner.submit("work", work, on_progress=progress.append)
+    assert runner.wait(5)
+    assert progress == [1, 2]
+
+
+def test_wait_waits_for_tasks_submitted_by_callbacks():
+    runner = TaskRunner("test")
+    results = []
+
+    def chain(result):
+        runner.submit("second", lambda task: result + 1, on_done=results.append)
+
+    runner.submit("first", lambda task: 1, on_done=chain)
+    assert runner.wait(5)
+    assert results == [2]
+
+
+def test_wait_times_out():
+    runner = TaskRunner("test")
+    release = threading.Event()
+    runner.submit("work", lambda task: release.wait(5))
+    assert not runner.wait(0.05)
+    release.set()
+    assert runner.wait(5)
+
+
+def test_wait_returns_for_task_of_closed_context(monkeypatch):
+    monkeypatch.setattr(executor, "_current_context", ClosedContext)
+    runner = TaskRunner("test")
+    results = []
+    runner.submit("work", lambda task: 1, on_done=results.append)
+    assert runner.wait(5)
+    assert results == []
+    assert not runner.running("work")
@@ -0,0 +1,68 @@
+import time
+
+import pandas as pd
+import pytest
+
+from surface_water import config, executor
+
+pytest.importorskip("geemap")
+pytest.importorskip("plotly")
+
+from surface_water import jrc  # noqa: E402
+
+
+class Task:
+    def __init__(self):
+        self.emitted = []
+
+    def cancelled(self):
+        return False
+
+    def emit(self, value):
+        self.emitted.append(value)
+
+
+def history_chunk(region, scale, denominator, start_date, end_date):
+    # Like the JRC monthly images, labeled YYYY_MM. Older periods finish
+    # last, so that periods complete out of order.
+    time.sleep((2020 - int(start_date[:4])) / 2000)
+    months = pd.date_range(start_date[:8] + "01", end_date, freq="MS", inclusive="left")
+    labels = [month.strftime("%Y_%m") for month in months]
+    return pd.DataFrame(
+        {
+            "Month": labels,
+            "Area": [float(i) for i in range(len(labels))],
+            "month": [label.split("_")[1] for label in labels],
+        }
+    )
+
+
+def test_history_chunks_cover_the_history():
+    chunks = jrc.history_chunks(10, "2005-07-01")
+
+    assert chunks == [
+        ("1984-03-16", "1994-01-01"),
+        ("1994-01-01", "2004-01-01"),
+        ("2004-01-01", "2005-07-01"),
+    ]
+    assert jrc.history_chunks(1, "2000-01-01")[-1] == ("1999-01-01", "2000-01-01")
+
+
+def test_streamed_history_equals_the_concatenated_periods(monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_END", "2000-07-01")
+    monkeypatch.setattr(executor, "_fanout_pool", None)
+    monkeypatch.setattr(jrc, "_history_chunk", history_chunk)
+    task = Task()
+
+    df = jrc._streamed_history(None, 30, 1e4, task, 3)
+
+    chunks = jrc.history_chunks(3)
+    expected = jrc._concat_history(history_chunk(None, 30, 1e4, *c) for c in chunks)
+    pd.testing.assert_frame_equal(df, expected)
+    assert df["Month"].iloc[0] == "1984_03"
+    assert df["Month"].iloc[-1] == "2000_06"
+    assert df["Month"].is_monotonic_increasing
+    # Partial results are published in the order of the periods too.
+    assert len(task.emitted) == len(chunks) - 1
+    for partial in task.emitted:
+        assert partial["Month"].is_monotonic_increasing
@@ -0,0 +1,48 @@
+import threading
+import time
+
+from surface_water import config, executor, reduction
+
+
+def test_concurrent_histograms_share_one_bounded_pool(monkeypatch):
+    monkeypatch.setattr(config, "TILE_PIXELS", 100)
+    monkeypatch.setattr(executor, "_fanout_pool", None)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def reduce_tile(image, band, bounds, geometry, scale, depth=0):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return {"1": 1}
+
+    monkeypatch.setattr(reduction, "_reduce_tile", reduce_tile)
+    monkeypatch.setattr(reduction, "region_bounds", lambda region: [0, 0, 0.01, 0.01])
+
+    class Image:
+        def select(self, bands):
+            return self
+
+    results = []
+
+    def histogram():
+        results.append(reduction.frequency_histogram(Image(), "b", None, 30))
+
+    threads = [threading.Thread(target=histogram) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] <= config.TILE_CONCURRENCY
+    assert len(results) == 4
+    assert len({r["1"] for r in results}) == 1
+
+
+def test_merge_histograms():
+    assert reduction.merge_histograms([{"1": 2}, None, {"1": 1, "2": 3}]) == {
+        "1": 3,
+        "2": 3,
+    }
@@ -0,0 +1,23 @@
+from surface_water import regions
+
+SQUARE = {
+    "type": "Polygon",
+    "coordinates": [[[0, 0], [0, 1.0000001], [1, 1], [1, 0], [0, 0]]],
+}
+
+
+def test_canonical_geojson_snaps_and_orders_the_rings():
+    result = regions.canonical_geojson(SQUARE)
+
+    assert result == {
+        "type": "Polygon",
+        "coordinates": [[[0.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, 0.0], [0.0, 0.0]]],
+    }
+    assert regions.canonical_geojson(result) == result
+
+
+def test_canonical_geojson_keeps_the_geodesic_flag():
+    planar = regions.canonical_geojson(dict(SQUARE, geodesic=False))
+
+    assert planar["geodesic"] is False
+    assert "geodesic" not in regions.canonical_geojson(SQUARE)
@@ -0,0 +1,53 @@
+import math
+from statistics import NormalDist
+
+import pytest
+
+from surface_water import sampling
+
+SQUARE = {
+    "type": "Polygon",
+    "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]],
+}
+
+
+def test_sample_size():
+    assert sampling.sample_size(0.005, 0.95) == 38415
+    assert sampling.sample_size(0.01, 0.95) == 9604
+    assert sampling.sample_size(0.01, 0.99) == 16588
+
+
+def test_allocate_in_proportion_to_area():
+    assert sampling.allocate([1, 1, 2], 100) == [25, 25, 50]
+    # Every stratum gets at least two points.
+    assert sampling.allocate([1, 999], 100) == [2, 100]
+
+
+def test_estimate():
+    z = NormalDist().inv_cdf(0.975)
+    histograms = [{"1": 2, "2": 2}, {"1.0": 3, str(sampling.MASKED): 1}, {}]
+
+    result = sampling.estimate(histograms, [1, 1, 2], 1000)
+
+    # Half of the area is not sampled, and a masked point is in no bin.
+    assert set(result) == {"1", "2"}
+    count, error = result["1"]
+    assert count == pytest.approx((0.25 * 0.5 + 0.25 * 0.75) * 1000)
+    variance = 0.25**2 * 0.25 / 3 + 0.25**2 * 0.75 * 0.25 / 3
+    assert error == pytest.approx(z * math.sqrt(variance) * 1000)
+    count, error = result["2"]
+    assert count == pytest.approx(0.25 * 0.5 * 1000)
+    assert error == pytest.approx(z * math.sqrt(0.25**2 * 0.25 / 3) * 1000)
+
+
+def test_strata_cover_the_region():
+    cells = sampling.strata(SQUARE, 4)
+
+    assert len(cells) == 4
+    assert sum(cell.area for cell, _ in cells) == pytest.approx(1)
+    # Cells nearer to the equator are larger.
+    south = [area for cell, area in cells if cell.centroid.y < 0.5]
+    north = [area for cell, area in cells if cell.centroid.y > 0.5]
+    assert min(south) > max(north)
+    total = sum(area for _, area in cells)
+    assert total == pytest.approx(sampling.METERS_PER_DEGREE**2, rel=1e-3)
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from surface_water import sessions
+from surface_water.executor import TaskRunner
+
+
+class Context:
+    """Stands in for a Solara kernel context."""
+
+    def __init__(self):
+        self.closed_event = threading.Event()
+        self.callbacks = []
+
+    def on_close(self, callback):
+        self.callbacks.append(callback)
+
+    def close(self, reason="unknown"):
+        self.closed_event.set()
+        for callback in self.callbacks:
+            callback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Map:
+    """Stands in for a page map, with the widget hooks used by the manager."""
+
+    def __init__(self):
+        self.runner = TaskRunner("test")
+        self.released = 0
+        self.observers = []
+        self.interactions = []
+
+    def observe(self, handler, names):
+        self.observers.append(handler)
+
+    def on_interaction(self, callback):
+        self.interactions.append(callback)
+
+    def close(self):
+        for handler in self.observers:
+            handler({"name": "comm", "old": object(), "new": None})
+
+    def interact(self):
+        for callback in self.interactions:
+            callback(type="mousemove", coordinates=[0, 0])
+
+    def release(self):
+        self.released += 1
+
+    def idle_for(self, seconds):
+        self.runner.last_active = time.monotonic() - seconds
+
+
+@pytest.fixture
+def context(monkeypatch):
+    context = Context()
+    monkeypatch.setattr(sessions, "_current_context", lambda: context)
+    return context
+
+
+@pytest.fixture
+def manager():
+    return sessions.SessionManager(idle_timeout=60, memory_budget=0, interval=3600)
+
+
+def test_maps_of_a_context_share_one_session(context, manager):
+    first, second = Map(), Map()
+    session = manager.register(first, first.release)
+
+    assert manager.register(second, second.release) is session
+    assert manager.sessions() == [session]
+    assert len(session.maps) == 2
+
+
+def test_session_is_evicted_once_all_maps_are_idle(context, manager):
+    first, second = Map(), Map()
+    manager.register(first, first.release)
+    manager.register(second, second.release)
+    first.idle_for(120)
+
+    manager.sweep()
+    assert not context.closed_event.is_set()
+    assert first.released == 0
+
+    second.idle_for(90)
+    manager.sweep()
+    assert context.closed_event.is_set()
+    assert (first.released, second.released) == (1, 1)
+    assert manager.sessions() == []
+
+
+def test_closed_maps_are_forgotten(context, manager):
+    first, second = Map(), Map()
+    session = manager.register(first, first.release)
+    manager.register(second, second.release)
+
+    first.close()
+    assert list(session.maps) == [id(second)]
+
+    second.close()
+    assert manager.sessions() == []
+
+
+def test_closed_context_forgets_its_session(context, manager):
+    m = Map()
+    manager.register(m, m.release)
+
+    context.close()
+
+    assert manager.sessions() == []
+    assert m.released == 0
+
+
+def test_interactions_and_touches_count_as_use(context, manager):
+    m = Map()
+    session = manager.register(m, m.release)
+
+    m.idle_for(120)
+    m.interact()
+    assert session.idle() < 1
+
+    m.idle_for(120)
+    m.runner.touch()
+    manager.sweep()
+    assert not context.closed_event.is_set()
+
+
+def test_maps_outside_of_solara_are_sessions_of_their_own(monkeypatch, manager):
+    monkeypatch.setattr(sessions, "_current_context", lambda: None)
+    first, second = Map(), Map()
+    manager.register(first, first.release)
+    manager.register(second, second.release)
+    first.idle_for(120)
+
+    manager.sweep()
+
+    assert (first.released, second.released) == (1, 0)
+    assert len(manager.sessions()) == 1
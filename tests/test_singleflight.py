@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from surface_water.executor import Cancelled
+from surface_water.singleflight import SingleFlight
+
+
+def run_concurrently(flights, key, leader_fn, waiter_fn, waiters=3):
+    """Run ``leader_fn`` under ``key`` and join it with callers of ``waiter_fn``.
+
+    Returns the outcome, result or exception, of the leader then the waiters.
+    """
+    started, release = threading.Event(), threading.Event()
+    outcomes = [None] * (waiters + 1)
+
+    def leader():
+        started.set()
+        release.wait(5)
+        return leader_fn()
+
+    def call(i, fn):
+        try:
+            outcomes[i] = flights.do(key, fn)
+        except BaseException as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(0, leader))]
+    threads[0].start()
+    started.wait(5)
+    for i in range(1, waiters + 1):
+        threads.append(threading.Thread(target=call, args=(i, waiter_fn)))
+        threads[-1].start()
+    # Let the waiters block on the run in flight.
+    time.sleep(0.1)
+    assert flights.in_flight() == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight()
+    calls = []
+
+    def waiter():
+        calls.append("waiter")
+        return "waiter"
+
+    outcomes = run_concurrently(flights, "key", lambda: "leader", waiter)
+
+    assert outcomes == ["leader"] * 4
+    assert calls == []
+
+
+def test_errors_reach_the_waiters():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    outcomes = run_concurrently(flights, "key", fail, lambda: "waiter")
+
+    assert [type(e) for e in outcomes] == [ValueError] * 4
+    assert len({id(e) for e in outcomes}) == 1
+
+
+def test_waiters_of_a_cancelled_run_start_a_new_one():
+    flights = SingleFlight()
+    calls = []
+
+    def cancel():
+        raise Cancelled()
+
+    def waiter():
+        calls.append("waiter")
+        return "waiter"
+
+    outcomes = run_concurrently(flights, "key", cancel, waiter)
+
+    assert isinstance(outcomes[0], Cancelled)
+    assert outcomes[1:] == ["waiter"] * 3
+    # Waiters retrying together share the new run, later ones start theirs.
+    assert 1 <= len(calls) <= 3
+
+
+def test_keys_are_cleared_after_the_run():
+    flights = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return len(calls)
+
+    assert flights.do("key", fn) == 1
+    assert flights.in_flight() == 0
+    assert flights.do("key", fn) == 2
+
+    with pytest.raises(ValueError):
+        flights.do("key", lambda: int("x"))
+    assert flights.in_flight() == 0
+    assert flights.do("key", fn) == 3
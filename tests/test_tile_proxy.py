@@ -0,0 +1,135 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from starlette.testclient import TestClient
+
+from surface_water import config, tile_proxy
+
+
+@pytest.fixture
+def upstream():
+    """A stand-in tile server, answering /z/x/y with the path as content."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path.startswith("/missing/"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            content = self.path.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TILE_PROXY_PATH", "/tiles")
+    monkeypatch.setattr(config, "TILE_CACHE_DIR", str(tmp_path / "tiles"))
+    monkeypatch.setattr(tile_proxy, "_store", None)
+    monkeypatch.setattr(tile_proxy, "_layers", tile_proxy.OrderedDict())
+    monkeypatch.setattr(tile_proxy, "_renderers", tile_proxy.OrderedDict())
+    store = tile_proxy.get_store()
+    store.wait()
+    return store
+
+
+def test_tiles_are_fetched_once(store, upstream):
+    base, requests = upstream
+    url = tile_proxy.register("layer", lambda: base + "/{z}/{x}/{y}")
+    assert url == "/tiles/layer/{z}/{x}/{y}"
+
+    assert tile_proxy.fetch_tile("layer", 3, 1, 2) == b"/3/1/2"
+    assert tile_proxy.fetch_tile("layer", 3, 1, 2) == b"/3/1/2"
+    assert requests == ["/3/1/2"]
+    assert store.size() == len(b"/3/1/2")
+
+
+def test_missing_tiles_are_not_stored(store, upstream):
+    base, requests = upstream
+    tile_proxy.register("layer", lambda: base + "/missing/{z}/{x}/{y}")
+
+    assert tile_proxy.fetch_tile("layer", 0, 0, 0) is None
+    assert tile_proxy.fetch_tile("layer", 0, 0, 0) is None
+    assert len(requests) == 2
+    assert store.size() == 0
+
+
+def test_unknown_layers_are_not_fetched(store, upstream):
+    assert tile_proxy.fetch_tile("unknown", 0, 0, 0) is None
+    assert upstream[1] == []
+
+
+def test_least_recently_used_layers_are_forgotten(store, upstream, monkeypatch):
+    base, requests = upstream
+    monkeypatch.setattr(config, "TILE_PROXY_LAYERS", 2)
+    for name in ["a", "b", "c"]:
+        tile_proxy.register(name, lambda name=name: f"{base}/{name}/{{z}}/{{x}}/{{y}}")
+
+    assert tile_proxy.fetch_tile("a", 0, 0, 0) is None
+    assert tile_proxy.fetch_tile("b", 0, 0, 0) == b"/b/0/0/0"
+    assert list(tile_proxy._layers) == ["c", "b"]
+
+
+def test_store_indexes_previous_tiles_and_skips_temporary_files(tmp_path):
+    directory = tmp_path / "tiles"
+    first = tile_proxy.TileStore(str(directory), 100)
+    first.wait()
+    first.put("layer", 0, 0, 0, b"x" * 10)
+    first.put("layer", 1, 0, 0, b"y" * 20)
+    partial = directory / "layer" / "1" / "0" / "1.123.tmp"
+    partial.write_bytes(b"z" * 50)
+
+    store = tile_proxy.TileStore(str(directory), 100)
+    assert store.wait(5)
+    assert store.size() == 30
+    assert store.get("layer", 1, 0, 0) == b"y" * 20
+    assert store.get("layer", 1, 0, 1) is None
+    assert os.path.exists(partial)
+
+
+def test_store_evicts_least_recently_used_tiles(tmp_path):
+    store = tile_proxy.TileStore(str(tmp_path), 25)
+    store.wait()
+    store.put("layer", 0, 0, 0, b"x" * 10)
+    store.put("layer", 1, 0, 0, b"y" * 10)
+    assert store.get("layer", 0, 0, 0) == b"x" * 10
+    store.put("layer", 1, 0, 1, b"z" * 10)
+
+    assert store.size() == 20
+    assert store.get("layer", 1, 0, 0) is None
+    assert store.get("layer", 0, 0, 0) == b"x" * 10
+
+
+def test_app_only_serves_fingerprints(store, upstream, monkeypatch):
+    base, requests = upstream
+    fingerprint = "0123456789abcdef" * 2
+    tile_proxy.register(fingerprint, lambda: base + "/{z}/{x}/{y}")
+    reads = []
+    monkeypatch.setattr(store, "get", lambda *key: reads.append(key))
+    client = TestClient(tile_proxy.app)
+
+    for name in ["layer", "..", "%2E%2E", fingerprint.upper(), fingerprint + "0"]:
+        assert client.get(f"/{name}/0/0/0").status_code == 404
+    assert reads == []
+
+    response = client.get(f"/{fingerprint}/3/1/2")
+    assert response.status_code == 200
+    assert response.content == b"/3/1/2"
+    assert reads == [(fingerprint, 3, 1, 2)]